@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass
-from typing import List
+from typing import Dict, List, Optional
 
 # Получаем ссылку из Vercel, если её нет — используем sqlite (для локального запуска)
 db_url = os.environ.get('DATABASE_URL')
@@ -19,6 +19,13 @@ class AIConfig:
     """Конфигурация для AI моделей"""
     OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY', '')
     MODEL_NAME: str = "gpt-5-nano"
+    GENERATION_CONCURRENCY: int = int(os.getenv('AI_GENERATION_CONCURRENCY', '4'))  # Тем, обрабатываемых параллельно
+    GENERATION_BATCH_SIZE: int = int(os.getenv('AI_GENERATION_BATCH_SIZE', '10'))  # Тем в одном запросе; 0 — без пакетов
+    # Кэш ответов LLM на диске (общий для процессов): промпт -> ответ
+    LLM_CACHE_ENABLED: bool = os.getenv('LLM_CACHE_ENABLED', '1') == '1'
+    LLM_CACHE_PATH: str = os.getenv('LLM_CACHE_PATH', 'llm_cache.db')
+    LLM_CACHE_TTL: int = int(os.getenv('LLM_CACHE_TTL', '86400'))  # Сек. жизни ответа
+    LLM_CACHE_MAX_ENTRIES: int = int(os.getenv('LLM_CACHE_MAX_ENTRIES', '10000'))
 
 @dataclass
 class ModeratorConfig:
@@ -26,6 +33,8 @@ class ModeratorConfig:
     SIMILARITY_THRESHOLD: float = 0.75  # Порог схожести тем
     MIN_BRAND_SCORE: float = 0.6  # Минимальный балл соответствия бренду
     MIN_TOPIC_SCORE: float = 0.7  # Минимальный балл по теме
+    # Тема и качество одним запросом к LLM; 0 — двумя отдельными (параллельными) запросами
+    COMBINED_AI_CHECK: bool = os.getenv('MODERATOR_COMBINED_CHECK', '1') == '1'
     
 @dataclass
 class SchedulerConfig:
@@ -33,10 +42,84 @@ class SchedulerConfig:
     DEFAULT_POSTS_PER_WEEK: int = 7
     POSTING_TIMES: List[str] = None
     TIMEZONE: str = "Europe/Moscow"
+    # Общий job store APScheduler (задачи переживают рестарт процесса)
+    JOBSTORE_URL: str = os.getenv('SCHEDULER_JOBSTORE_URL') or db_url or 'sqlite:///content_platform.db'
+    # Выполнять задачи job store в этом процессе. Исполнитель должен быть ровно один:
+    # APScheduler 3.x не поддерживает несколько планировщиков на одном хранилище.
+    # Не задано — задачи выполняет демон публикаций, веб-воркеры только пишут их в БД;
+    # при нескольких репликах демона на всех, кроме одной, ставьте SCHEDULER_RUN_JOBS=0
+    RUN_JOBS: Optional[bool] = {'1': True, '0': False}.get(os.getenv('SCHEDULER_RUN_JOBS', ''))
+    MISFIRE_GRACE_TIME: int = int(os.getenv('SCHEDULER_MISFIRE_GRACE_TIME', '3600'))  # Сек. опоздания, когда задачу еще выполняем
+    PLATFORM_TIMEOUT: float = float(os.getenv('SCHEDULER_PLATFORM_TIMEOUT', '60'))  # Сек. на публикацию в одну соцсеть
+    PLATFORM_TIMEOUTS: Dict[str, float] = None  # Переопределения по платформам: "vk=60,telegram=20"
+    # Подбор времени публикации по истории охватов (час недели)
+    OPTIMIZER_MIN_POSTS: int = int(os.getenv('SCHEDULER_OPTIMIZER_MIN_POSTS', '20'))  # Меньше — спрашиваем LLM
+    OPTIMIZER_LOOKBACK_DAYS: int = int(os.getenv('SCHEDULER_OPTIMIZER_LOOKBACK_DAYS', '90'))
+    OPTIMIZER_SMOOTHING_HOURS: float = float(os.getenv('SCHEDULER_OPTIMIZER_SMOOTHING_HOURS', '1.5'))  # Сигма сглаживания
+    OPTIMIZER_PRIOR_POSTS: float = float(os.getenv('SCHEDULER_OPTIMIZER_PRIOR_POSTS', '3'))  # Вес среднего по аккаунту
     
     def __post_init__(self):
         if self.POSTING_TIMES is None:
             self.POSTING_TIMES = ["09:00", "13:00", "18:00", "21:00"]
+        if self.PLATFORM_TIMEOUTS is None:
+            self.PLATFORM_TIMEOUTS = {}
+            for pair in os.getenv('SCHEDULER_PLATFORM_TIMEOUTS', '').split(','):
+                if '=' in pair:
+                    platform, timeout = pair.split('=', 1)
+                    self.PLATFORM_TIMEOUTS[platform.strip()] = float(timeout)
+
+    def platform_timeout(self, platform: str) -> float:
+        return self.PLATFORM_TIMEOUTS.get(platform, self.PLATFORM_TIMEOUT)
+
+@dataclass
+class DaemonConfig:
+    """Настройки демона публикаций (run_publisher.py)"""
+    REFILL_INTERVAL: int = int(os.getenv('DAEMON_REFILL_INTERVAL', '60'))  # Сек. между проверками очередей
+    RESYNC_INTERVAL: int = int(os.getenv('DAEMON_RESYNC_INTERVAL', '300'))  # Сек. между сверкой heap с БД
+    CHANGE_CHECK_INTERVAL: int = int(os.getenv('DAEMON_CHANGE_CHECK_INTERVAL', '10'))  # Сек. между сверкой ближайших постов
+    PUBLISH_WORKERS: int = int(os.getenv('DAEMON_PUBLISH_WORKERS', '8'))  # Потоков публикации
+    LEASE_SECONDS: int = int(os.getenv('DAEMON_LEASE_SECONDS', '300'))  # Время аренды поста репликой
+    GENERATION_WORKERS: int = int(os.getenv('DAEMON_GENERATION_WORKERS', '2'))  # Параллельных генераций
+    GENERATION_QUEUE_SIZE: int = int(os.getenv('DAEMON_GENERATION_QUEUE_SIZE', '100'))
+    METRICS_PORT: int = int(os.getenv('DAEMON_METRICS_PORT', '9470'))  # 0 — не поднимать /metrics
+    METRICS_HOST: str = os.getenv('DAEMON_METRICS_HOST', '127.0.0.1')  # 0.0.0.0 — доступ снаружи
+    MAX_PUBLISH_ATTEMPTS: int = int(os.getenv('DAEMON_MAX_PUBLISH_ATTEMPTS', '5'))  # Потом пост уходит в 'dead'
+    RETRY_BASE_DELAY: int = int(os.getenv('DAEMON_RETRY_BASE_DELAY', '30'))  # Сек., удваивается с каждой попыткой
+    RETRY_MAX_DELAY: int = int(os.getenv('DAEMON_RETRY_MAX_DELAY', '1800'))
+
+@dataclass
+class CollectorConfig:
+    """Настройки сборщика аналитики (run_collector.py)"""
+    INTERVAL: int = int(os.getenv('COLLECTOR_INTERVAL', '900'))  # Сек. между обходами всех аккаунтов
+    WORKERS: int = int(os.getenv('COLLECTOR_WORKERS', '4'))  # Аккаунтов, синхронизируемых одновременно
+    METRICS_PORT: int = int(os.getenv('COLLECTOR_METRICS_PORT', '9471'))  # 0 — не поднимать /metrics
+    METRICS_HOST: str = os.getenv('COLLECTOR_METRICS_HOST', '127.0.0.1')  # 0.0.0.0 — доступ снаружи
+
+@dataclass
+class VKConfig:
+    """Настройки доступа к VK API"""
+    API_VERSION: str = "5.199"
+    API_BASE_URL: str = os.getenv('VK_API_BASE_URL', 'https://api.vk.com/method')  # Для тестов — адрес vk_simulator.py
+    RATE_LIMIT_PER_SECOND: float = float(os.getenv('VK_RATE_LIMIT_PER_SECOND', '3'))  # Лимит VK на один токен
+    RATE_LIMIT_BURST: int = int(os.getenv('VK_RATE_LIMIT_BURST', '3'))
+    # Сколько процессов шлют запросы с одними токенами (реплики демона + сборщик + веб):
+    # лимит на токен делится между ними поровну
+    RATE_LIMIT_PROCESSES: int = int(os.getenv('VK_RATE_LIMIT_PROCESSES', '3'))
+    POOL_SIZE: int = int(os.getenv('VK_POOL_SIZE', '20'))  # Keep-alive соединений на хост
+    ASYNC_CONNECTIONS: int = int(os.getenv('VK_ASYNC_CONNECTIONS', '100'))  # Соединений асинхронного клиента
+    CONNECT_TIMEOUT: float = float(os.getenv('VK_CONNECT_TIMEOUT', '5'))
+    READ_TIMEOUT: float = float(os.getenv('VK_READ_TIMEOUT', '30'))
+    DOWNLOAD_TIMEOUT: float = float(os.getenv('VK_DOWNLOAD_TIMEOUT', '60'))  # Скачивание/загрузка картинок
+    PHOTO_UPLOAD_WORKERS: int = int(os.getenv('VK_PHOTO_UPLOAD_WORKERS', '4'))  # Параллельных загрузок фото
+    PHOTO_CACHE_TTL_DAYS: int = int(os.getenv('VK_PHOTO_CACHE_TTL_DAYS', '30'))  # Повторное использование загруженных фото
+    UPLOAD_SERVER_TTL: int = int(os.getenv('VK_UPLOAD_SERVER_TTL', '300'))  # Сек. жизни адреса getWallUploadServer
+    WALL_SYNC_PAGE_SIZE: int = int(os.getenv('VK_WALL_SYNC_PAGE_SIZE', '100'))  # Максимум wall.get за запрос
+    WALL_SYNC_LOOKBACK_DAYS: int = int(os.getenv('VK_WALL_SYNC_LOOKBACK_DAYS', '7'))  # Сколько дней метрики постов еще меняются
+    WALL_SYNC_MAX_PAGES: int = int(os.getenv('VK_WALL_SYNC_MAX_PAGES', '50'))  # Предел страниц за одну синхронизацию
+    GROUP_CACHE_TTL: int = int(os.getenv('VK_GROUP_CACHE_TTL', '3600'))  # Сек. жизни метаданных группы в кэше
+    TOKEN_CACHE_TTL: int = int(os.getenv('VK_TOKEN_CACHE_TTL', '1800'))  # Сек. жизни отметки о валидности токена
+    ACCOUNT_CACHE_SIZE: int = int(os.getenv('VK_ACCOUNT_CACHE_SIZE', '10000'))
+    ACCOUNT_REFRESH_INTERVAL: int = int(os.getenv('VK_ACCOUNT_REFRESH_INTERVAL', '600'))  # Сек. между фоновыми обновлениями
 
 @dataclass
 class SocialNetworksConfig:
@@ -53,4 +136,7 @@ class SocialNetworksConfig:
 ai_config = AIConfig()
 moderator_config = ModeratorConfig()
 scheduler_config = SchedulerConfig()
+daemon_config = DaemonConfig()
+collector_config = CollectorConfig()
+vk_config = VKConfig()
 social_config = SocialNetworksConfig()
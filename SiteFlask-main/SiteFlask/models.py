@@ -1,3 +1,4 @@
+from datetime import datetime
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 
@@ -12,3 +13,50 @@ class User(UserMixin, db.Model):
     # Заглушки методов, чтобы Flask-Login не ругался
     def get_id(self):
         return str(self.id)
+
+
+class PostLease(db.Model):
+    """Аренда поста репликой демона: пока аренда жива, другие реплики пост не берут"""
+    post_id = db.Column(db.Integer, primary_key=True)
+    owner = db.Column(db.String(150), nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class PostRetry(db.Model):
+    """Счетчик повторных попыток публикации поста после временных ошибок"""
+    post_id = db.Column(db.Integer, primary_key=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text)
+    original_publish_date = db.Column(db.DateTime)  # Для честного расчета опоздания
+    next_attempt_at = db.Column(db.DateTime)
+
+
+class PhotoAttachmentCache(db.Model):
+    """Кэш загруженных в VK фото: (хэш источника, группа) -> вложение photo{owner}_{id}"""
+    id = db.Column(db.Integer, primary_key=True)
+    source_hash = db.Column(db.String(64), nullable=False)
+    owner_id = db.Column(db.String(32), nullable=False)
+    attachment = db.Column(db.String(64), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.UniqueConstraint('source_hash', 'owner_id'),)
+
+
+class VKSyncState(db.Model):
+    """Отметка синхронизации стены группы: последний уже обработанный пост VK"""
+    vk_account_id = db.Column(db.Integer, primary_key=True)
+    last_post_id = db.Column(db.Integer, nullable=False, default=0)
+    last_synced_at = db.Column(db.DateTime)
+
+
+class PostPlatformStatus(db.Model):
+    """Результат публикации поста планировщика в отдельную соцсеть (успешные повторно не публикуются)"""
+    id = db.Column(db.Integer, primary_key=True)
+    post_key = db.Column(db.String(64), nullable=False)  # ScheduledPost.id
+    platform = db.Column(db.String(32), nullable=False)
+    success = db.Column(db.Boolean, nullable=False, default=False)
+    external_id = db.Column(db.String(64))  # ID поста в соцсети
+    error = db.Column(db.Text)
+    updated_at = db.Column(db.DateTime, default=datetime.now)
+
+    __table_args__ = (db.UniqueConstraint('post_key', 'platform'),)
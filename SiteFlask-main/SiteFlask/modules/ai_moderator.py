@@ -1,18 +1,25 @@
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor
 from openai import OpenAI  # <--- Новый импорт
 import numpy as np
 from datetime import datetime
 import json
 
-from config.settings import ai_config
+from config.settings import ai_config, moderator_config
+from modules.stop_words import stop_word_matcher
+from utils.llm_cache import llm_cache
 from utils.logger import get_logger
+from utils.metrics import LLM_REQUEST_DURATION
 
 logger = get_logger(__name__)
 
 # Инициализация клиента OpenAI (v1.0+)
 client = OpenAI(api_key=ai_config.OPENAI_API_KEY)
 
+# Для политики с отдельными проверками: тема и качество запрашиваются параллельно
+_checks_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="moderation")
+
 logger = get_logger(__name__)
 
 @dataclass
@@ -26,7 +33,7 @@ class ModerationResult:
 class AIContentModerator:
     def __init__(self, business_info: Dict):
         self.business_info = business_info
-        self.stop_words = set(business_info.get('stop_words', []))
+        self.stop_matcher = stop_word_matcher(business_info.get('stop_words', []))
         self.brand_values = business_info.get('brand_values', [])
         self.target_topics = business_info.get('topics', [])
         self.published_content = []
@@ -43,15 +50,16 @@ class AIContentModerator:
         scores['stop_words'] = stop_check['score']
         if not stop_check['passed']:
             issues.extend(stop_check['issues'])
+            # Стоп-слово — отказ без платных проверок
+            return ModerationResult(False, 0.0, issues, suggestions, scores)
+
+        # 2-3. Релевантность теме и AI Quality Check (AI)
+        topic_check, quality_check = self._ai_checks(content)
 
-        # 2. Релевантность теме (AI)
-        topic_check = self._check_topic_relevance(content)
         scores['topic'] = topic_check['score']
         if not topic_check['passed']:
             issues.extend(topic_check['issues'])
 
-        # 3. AI Quality Check (AI)
-        quality_check = self._ai_quality_check(content)
         scores['quality'] = quality_check['score']
         if not quality_check['passed']:
              issues.extend(quality_check['issues'])
@@ -63,8 +71,7 @@ class AIContentModerator:
         return ModerationResult(passed, overall_score, issues, suggestions, scores)
 
     def _check_stop_words(self, text: str) -> Dict:
-        text_lower = text.lower()
-        found = [w for w in self.stop_words if w.lower() in text_lower]
+        found = self.stop_matcher.find(text)
         return {
             'passed': len(found) == 0,
             'score': 1.0 if not found else 0.0,
@@ -73,33 +80,79 @@ class AIContentModerator:
 
     def _call_openai(self, prompt: str) -> Dict:
         """Универсальный метод для вызова нового API"""
+        def request() -> str:
+            with LLM_REQUEST_DURATION.time(client='openai'):
+                response = client.chat.completions.create(
+                    model=ai_config.MODEL_NAME, # gpt-4o-mini или gpt-3.5-turbo
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={ "type": "json_object" } # Гарантирует JSON  
+                )
+            return response.choices[0].message.content
+
         try:
-            response = client.chat.completions.create(
-                model=ai_config.MODEL_NAME, # gpt-4o-mini или gpt-3.5-turbo
-                messages=[{"role": "user", "content": prompt}],
-                response_format={ "type": "json_object" } # Гарантирует JSON  
-            )
-            return json.loads(response.choices[0].message.content)
+            # Оценка одного и того же текста детерминирована по смыслу — повтор берем из кэша
+            return json.loads(llm_cache.get_or_call(ai_config.MODEL_NAME, prompt, request, validate=json.loads))
         except Exception as e:
             logger.error(f"OpenAI API Error: {e}")
             return {}
 
-    def _check_topic_relevance(self, content: Dict) -> Dict:
+    def _ai_checks(self, content: Dict) -> Tuple[Dict, Dict]:
+        """Проверки темы и качества: одним запросом или двумя одновременными"""
+        if moderator_config.COMBINED_AI_CHECK:
+            return self._combined_ai_check(content)
+
+        topic_future = _checks_executor.submit(self._check_topic_relevance, content)
+        quality_check = self._ai_quality_check(content)
+        return topic_future.result(), quality_check
+
+    def _combined_ai_check(self, content: Dict) -> Tuple[Dict, Dict]:
         prompt = f"""
-        Ты строгий модератор контента.
+        Ты строгий модератор контента для соцсетей.
         Бизнес: {', '.join(self.target_topics)}.
         Текст: {content.get('text')}
-        Оцени релевантность теме от 0.0 до 1.0. Верни JSON: {{ "score": float, "reason": str }}
+        1. Оцени релевантность текста теме бизнеса от 0.0 до 1.0.
+        2. Оцени качество текста (0.0-1.0) по критериям: грамматика, стиль, продающая структура.
+        Верни JSON: {{ "topic_score": float, "topic_reason": str, "quality_score": float, "quality_issues": [str] }}
         """
         res = self._call_openai(prompt)
-        score = res.get('score', 0.5)
-        print(score)
+        return (
+            self._topic_result(res.get('topic_score'), res.get('topic_reason')),
+            self._quality_result(res.get('quality_score'), res.get('quality_issues'))
+        )
+
+    @staticmethod
+    def _as_score(value, default: float) -> float:
+        try:
+            return min(1.0, max(0.0, float(value)))
+        except (TypeError, ValueError):
+            return default
+
+    def _topic_result(self, score, reason) -> Dict:
+        score = self._as_score(score, 0.5)
         return {
             'passed': score >= 0.7, 
             'score': score, 
-            'issues': [res.get('reason')] if score < 0.7 else []
+            'issues': [reason] if score < 0.7 else []
         }
 
+    def _quality_result(self, score, issues) -> Dict:
+        score = self._as_score(score, 0.7) # Дефолт, если AI упал
+        return {
+            'passed': score >= 0.6,
+            'score': score,
+            'issues': [str(issue) for issue in issues] if isinstance(issues, list) else []
+        }
+
+    def _check_topic_relevance(self, content: Dict) -> Dict:
+        prompt = f"""
+        Ты строгий модератор контента.
+        Бизнес: {', '.join(self.target_topics)}.
+        Текст: {content.get('text')}
+        Оцени релевантность теме от 0.0 до 1.0. Верни JSON: {{ "score": float, "reason": str }}
+        """
+        res = self._call_openai(prompt)
+        return self._topic_result(res.get('score'), res.get('reason'))
+
     def _ai_quality_check(self, content: Dict) -> Dict:
         prompt = f"""
         Проверь качество текста для соцсетей.
@@ -108,12 +161,7 @@ class AIContentModerator:
         Верни JSON: {{ "score": float, "issues": [str] }}
         """
         res = self._call_openai(prompt)
-        score = res.get('score', 0.7) # Дефолт, если AI упал, но тут он не упадет
-        return {
-            'passed': score >= 0.6,
-            'score': score,
-            'issues': res.get('issues', [])
-        }
+        return self._quality_result(res.get('score'), res.get('issues'))
     
     def add_to_published(self, content: Dict):
         """Добавить контент в историю опубликованного"""
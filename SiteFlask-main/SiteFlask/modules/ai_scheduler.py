@@ -1,15 +1,19 @@
 from datetime import datetime, timedelta
-from typing import Dict, List
-from dataclasses import dataclass
-from apscheduler.schedulers.background import BackgroundScheduler
+from typing import Dict, List, Optional
+from dataclasses import dataclass, asdict
 from apscheduler.triggers.date import DateTrigger
 from openai import OpenAI 
+import asyncio
 import json
 import uuid
 
-from config.settings import ai_config
+from config.settings import ai_config, scheduler_config
+from utils.llm_cache import llm_cache
 from utils.logger import get_logger
+from utils.metrics import LLM_REQUEST_DURATION, PUBLISH_LAG, PUBLISHED_POSTS
 from modules.social_api import SocialMediaPublisher
+from modules.posting_time_optimizer import posting_time_optimizer
+from modules.shared_scheduler import get_shared_scheduler, shutdown_shared_scheduler
 
 logger = get_logger(__name__)
 client = OpenAI(api_key=ai_config.OPENAI_API_KEY)
@@ -22,36 +26,133 @@ class ScheduledPost:
     platforms: List[str]
     status: str = "scheduled"
 
+def run_scheduled_post(post_data: Dict, vk_account_id: Optional[int]):
+    """
+    Точка входа задач APScheduler.
+    Функция модуля сериализуется в job store ссылкой, пост приходит в аргументах
+    задачи, а токен и данные бизнеса читаются из БД по ID аккаунта в момент запуска
+    (секреты в job store не попадают). Задача выполнится и после рестарта.
+    """
+    from flask import has_app_context
+
+    if has_app_context():
+        _run_scheduled_post(post_data, vk_account_id)
+        return
+
+    # Задачи выполняются в потоке APScheduler, без контекста Flask
+    from app import app
+    with app.app_context():
+        _run_scheduled_post(post_data, vk_account_id)
+
+def _run_scheduled_post(post_data: Dict, vk_account_id):
+    account_id = _job_account_id(vk_account_id)
+    business_info = _load_business_info(account_id)
+    if business_info is None:
+        logger.error(f"Аккаунт {account_id} для поста {post_data.get('id')} не найден, публикация пропущена")
+        return
+
+    scheduler = AIContentScheduler(business_info)
+    post = ScheduledPost(**post_data)
+    scheduler.scheduled_posts[post.id] = post
+    scheduler._publish_post_wrapper(post.id)
+
+def _job_account_id(arg) -> Optional[int]:
+    """ID аккаунта из аргумента задачи (старые задачи хранили business_info целиком)"""
+    if isinstance(arg, dict):
+        return arg.get('vk_account_id')
+    return arg
+
+def _load_business_info(vk_account_id: Optional[int]) -> Optional[Dict]:
+    """business_info для публикации: токен и группа берутся из БД, а не из job store"""
+    from models import VKAccount, BusinessProfile
+
+    if vk_account_id is None:
+        return None
+    account = VKAccount.query.get(vk_account_id)
+    if not account:
+        return None
+    profile = BusinessProfile.query.filter_by(user_id=account.user_id).first()
+    return {
+        'user_id': account.user_id,
+        'vk_account_id': account.id,
+        'vk_group_id': account.group_id,
+        'access_token': account.access_token,
+        'description': profile.description if profile else '',
+        'business_type': profile.niche if profile else '',
+        'connected_platforms': ['vk']
+    }
+
 class AIContentScheduler:
     def __init__(self, business_info: Dict):
         self.business_info = business_info
-        self.scheduler = BackgroundScheduler()
+        # Один планировщик на процесс с задачами в БД (не поток на каждый экземпляр)
+        self.scheduler = get_shared_scheduler()
         self.publisher = SocialMediaPublisher()
         self.scheduled_posts = {}
-        self.scheduler.start()
 
-    def create_posting_schedule(self, content_list: List[Dict], start_date=None) -> List[ScheduledPost]:
+    def _add_job(self, post: ScheduledPost):
+        """Ставит (или заменяет) задачу публикации в общем планировщике"""
+        self.scheduler.add_job(
+            run_scheduled_post,
+            trigger=DateTrigger(run_date=post.scheduled_time),
+            # Только ID аккаунта: access_token в job store не сохраняем
+            args=[asdict(post), self.business_info.get('vk_account_id')],
+            id=post.id,
+            replace_existing=True
+        )
+
+    def _owns_job(self, job) -> bool:
+        return _job_account_id(job.args[1]) == self.business_info.get('vk_account_id')
+
+    def _get_post(self, post_id: str) -> Optional[ScheduledPost]:
+        """Пост из памяти экземпляра или из аргументов задачи в общем планировщике"""
+        post = self.scheduled_posts.get(post_id)
+        if post:
+            return post
+
+        job = self.scheduler.get_job(post_id)
+        if job and job.func is run_scheduled_post:
+            post = ScheduledPost(**job.args[0])
+            self.scheduled_posts[post_id] = post
+        return post
+
+    def create_posting_schedule(self, content_list: List[Dict], start_date=None, add_jobs: bool = True) -> List[ScheduledPost]:
+        """
+        Подбирает время для каждого поста.
+        add_jobs=False — только расписание: посты сохраняет вызывающий код строками
+        Post со статусом 'scheduled', и публикует их демон (иначе пост уйдет дважды).
+        """
         if not start_date:
             start_date = datetime.now()
             
-        # Спрашиваем у AI лучшее время
-        best_times = self._get_best_posting_times()
+        # Лучшие часы по истории вовлеченности аккаунта; без истории спрашиваем у AI
+        matrix = posting_time_optimizer.matrix_for(self.business_info)
+        if matrix is not None:
+            best_times = None
+            history_slots = posting_time_optimizer.next_slots(matrix, len(content_list), start_date, datetime.now())
+            logger.info(f"🕒 Лучшие слоты по истории: {posting_time_optimizer.describe(posting_time_optimizer.top_slots(matrix))}")
+        else:
+            best_times = self._get_best_posting_times()
         
         scheduled_result = []
         current_date = start_date
 
         for i, content in enumerate(content_list):
-            # Берем время из списка лучших (циклично)
-            time_str = best_times[i % len(best_times)]
-            hour, minute = map(int, time_str.split(':'))
-            
-            # Собираем дату
-            post_date = current_date.replace(hour=hour, minute=minute, second=0)
-            
-            # Если время уже прошло сегодня, переносим на завтра
-            if post_date < datetime.now():
-                post_date += timedelta(days=1)
-                current_date += timedelta(days=1) # Сдвигаем текущий день тоже
+            if matrix is not None:
+                # Лучший час дня недели; каждый пост на день позже предыдущего
+                post_date = history_slots[i]
+            else:
+                # Берем время из списка лучших (циклично)
+                time_str = best_times[i % len(best_times)]
+                hour, minute = map(int, time_str.split(':'))
+                
+                # Собираем дату
+                post_date = current_date.replace(hour=hour, minute=minute, second=0)
+                
+                # Если время уже прошло сегодня, переносим на завтра
+                if post_date < datetime.now():
+                    post_date += timedelta(days=1)
+                    current_date += timedelta(days=1) # Сдвигаем текущий день тоже
             
             platforms = self._select_platforms(content)
             
@@ -66,16 +167,12 @@ class AIContentScheduler:
             # 1. Сохраняем в память планировщика
             self.scheduled_posts[post.id] = post
             
-            # 2. Добавляем задачу в APScheduler
-            self.scheduler.add_job(
-                self._publish_post_wrapper,
-                trigger=DateTrigger(run_date=post.scheduled_time),
-                args=[post.id],
-                id=post.id
-            )
-            
-            # 3. ВАЖНО: Сохраняем в БД со статусом scheduled, чтобы работал счетчик
-            self._save_temp_post_to_db(post)
+            if add_jobs:
+                # 2. Добавляем задачу в общий APScheduler (сохраняется в БД)
+                self._add_job(post)
+                
+                # 3. ВАЖНО: Сохраняем в БД со статусом scheduled, чтобы работал счетчик
+                self._save_temp_post_to_db(post)
             
             scheduled_result.append(post)
             
@@ -85,19 +182,24 @@ class AIContentScheduler:
         return scheduled_result
     #Github ругается
     def _get_best_posting_times(self) -> List[str]:
-        """AI определяет лучшее время для постинга"""
+        """AI определяет лучшее время для постинга (когда истории аккаунта еще мало)"""
         prompt = f"""
         Бизнес: {self.business_info.get('business_type')}.
         Предложи 3 лучших времени для постинга (формат HH:MM).
         Верни JSON: {{ "times": ["09:00", "18:00", "21:00"] }}
         """
+        def request() -> str:
+            with LLM_REQUEST_DURATION.time(client='openai'):
+                response = client.chat.completions.create(
+                    model=ai_config.MODEL_NAME,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={ "type": "json_object" }
+                )
+            return response.choices[0].message.content
+
         try:
-            response = client.chat.completions.create(
-                model=ai_config.MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={ "type": "json_object" }
-            )
-            data = json.loads(response.choices[0].message.content)
+            # Ответ зависит только от типа бизнеса — берем из кэша
+            data = json.loads(llm_cache.get_or_call(ai_config.MODEL_NAME, prompt, request, validate=json.loads))
             times = data.get('times')
             if isinstance(times, list) and len(times) > 0:
                 return times
@@ -123,30 +225,26 @@ class AIContentScheduler:
         
         logger.info(f"Начало публикации поста: {post.content.get('title')}")
         
-        success = True
-        published_vk_id = None
-        
         # --- 1. ПУБЛИКАЦИЯ В СОЦСЕТИ ---
-        for platform in post.platforms:
-            try:
-                result = self.publisher.publish(
-                    platform=platform,
-                    content=post.content,
-                    business_info=self.business_info
-                )
-                
-                if not result['success']:
-                    success = False
-                    logger.error(f"Ошибка: {result.get('error')}")
-                else:
-                    # Если это VK, запоминаем ID поста
-                    if platform == 'vk':
-                        published_vk_id = result.get('post_id')
+        # Платформы, куда пост уже ушел при прошлой попытке, повторно не публикуем
+        external_ids = self._load_published_platforms(post.id)
+        pending = [platform for platform in post.platforms if platform not in external_ids]
+        if external_ids:
+            logger.info(f"⏭️ Уже опубликовано в: {', '.join(external_ids)}")
+
+        if pending:
+            results = asyncio.run(self._fan_out(post, pending))
+            self._save_platform_results(post.id, results)
+            for platform, result in results.items():
+                if result.get('success'):
+                    external_ids[platform] = result.get('post_id')
                     logger.info(f"✅ Успешно опубликовано в {platform}")
-                    
-            except Exception as e:
-                logger.error(f"Исключение: {e}")
-                success = False
+                else:
+                    logger.error(f"Ошибка {platform}: {result.get('error')}")
+
+        success = all(platform in external_ids for platform in post.platforms)
+        # Если это VK, запоминаем ID поста
+        published_vk_id = external_ids.get('vk')
         
         # --- 2. ОБНОВЛЕНИЕ СТАТУСА В БАЗЕ ДАННЫХ ---
         remaining_posts_count = 0 
@@ -178,8 +276,10 @@ class AIContentScheduler:
             
         if success:
             post.status = "published"
+            PUBLISH_LAG.observe((datetime.now() - post.scheduled_time).total_seconds(), source='scheduler')
         else:
             post.status = "failed"
+        PUBLISHED_POSTS.inc(source='scheduler', status=post.status)
 
         # --- 3. АВТОПОПОЛНЕНИЕ ОЧЕРЕДИ ---
         # Если постов осталось 0 (или меньше), запускаем генерацию новых
@@ -187,6 +287,60 @@ class AIContentScheduler:
             logger.info("🪫 Очередь пуста! Запускаю автогенерацию 5 новых постов...")
             self._auto_refill_queue(count=5)
 
+    async def _fan_out(self, post: ScheduledPost, platforms: List[str]) -> Dict[str, Dict]:
+        """Одновременная публикация во все платформы, у каждой свой таймаут"""
+        async def publish_one(platform):
+            timeout = scheduler_config.platform_timeout(platform)
+            try:
+                return await asyncio.wait_for(
+                    self.publisher.publish_async(platform, post.content, self.business_info),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                return {'success': False, 'error': f'Timeout {timeout:g}s'}
+            except Exception as e:
+                return {'success': False, 'error': str(e)}
+
+        try:
+            results = await asyncio.gather(*(publish_one(platform) for platform in platforms))
+        finally:
+            await self.publisher.aclose()
+        return dict(zip(platforms, results))
+
+    def _load_published_platforms(self, post_key: str) -> Dict[str, Optional[str]]:
+        """{platform: external_id} для платформ, где пост уже опубликован"""
+        from models import PostPlatformStatus
+        try:
+            rows = PostPlatformStatus.query.filter_by(post_key=post_key, success=True).all()
+            return {row.platform: row.external_id for row in rows}
+        except Exception as e:
+            logger.error(f"Не удалось прочитать статусы платформ: {e}")
+            return {}
+
+    def _save_platform_results(self, post_key: str, results: Dict[str, Dict]):
+        from models import db, PostPlatformStatus
+        try:
+            existing = {
+                row.platform: row
+                for row in PostPlatformStatus.query.filter(
+                    PostPlatformStatus.post_key == post_key,
+                    PostPlatformStatus.platform.in_(list(results))
+                ).all()
+            }
+            for platform, result in results.items():
+                row = existing.get(platform)
+                if row is None:
+                    row = PostPlatformStatus(post_key=post_key, platform=platform)
+                    db.session.add(row)
+                row.success = bool(result.get('success'))
+                row.external_id = str(result['post_id']) if result.get('post_id') is not None else None
+                row.error = None if row.success else str(result.get('error'))[:1000]
+                row.updated_at = datetime.now()
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Не удалось сохранить статусы платформ: {e}")
+            db.session.rollback()
+
     def _auto_refill_queue(self, count=5):
         """Автоматическая генерация и добавление постов в расписание"""
         try:
@@ -225,11 +379,12 @@ class AIContentScheduler:
         }}
         """
         try:
-            response = client.chat.completions.create(
-                model=ai_config.MODEL_NAME,
-                messages=[{"role": "user", "content": prompt}],
-                response_format={ "type": "json_object" }
-            )
+            with LLM_REQUEST_DURATION.time(client='openai'):
+                response = client.chat.completions.create(
+                    model=ai_config.MODEL_NAME,
+                    messages=[{"role": "user", "content": prompt}],
+                    response_format={ "type": "json_object" }
+                )
             data = json.loads(response.choices[0].message.content)
             posts = data.get('posts', [])
             return posts
@@ -263,7 +418,7 @@ class AIContentScheduler:
         """Отмена запланированного поста"""
         from models import db, Post # Для обновления БД при отмене
         
-        post = self.scheduled_posts.get(post_id)
+        post = self._get_post(post_id)
         
         if not post:
             logger.warning(f"Пост {post_id} не найден")
@@ -294,13 +449,14 @@ class AIContentScheduler:
         """Перенос публикации на другое время"""
         from models import db, Post
 
-        post = self.scheduled_posts.get(post_id)
+        post = self._get_post(post_id)
         if not post:
             return False
         
         try:
-            self.scheduler.reschedule_job(post.id, trigger=DateTrigger(run_date=new_datetime))
             post.scheduled_time = new_datetime
+            # Пересоздаем задачу: в ее аргументах тоже хранится время поста
+            self._add_job(post)
             
             # Обновляем в БД
             db_post = Post.query.filter_by(vk_post_id=f"temp_{post.id}").first()
@@ -316,8 +472,14 @@ class AIContentScheduler:
     
     def get_calendar(self, start_date: datetime, end_date: datetime) -> List[Dict]:
         """Получение календаря публикаций"""
+        # Задачи общего планировщика (в том числе поднятые из БД) + посты этого экземпляра
+        posts = dict(self.scheduled_posts)
+        for job in self.scheduler.get_jobs():
+            if job.func is run_scheduled_post and self._owns_job(job):
+                posts.setdefault(job.id, ScheduledPost(**job.args[0]))
+
         calendar = []
-        for post in self.scheduled_posts.values():
+        for post in posts.values():
             if start_date <= post.scheduled_time <= end_date:
                 calendar.append({
                     'id': post.id,
@@ -330,6 +492,5 @@ class AIContentScheduler:
         return calendar
     
     def shutdown(self):
-        """Корректное завершение работы планировщика"""
-        self.scheduler.shutdown()
-        logger.info("Планировщик остановлен")
+        """Корректное завершение работы планировщика (общего для всего процесса)"""
+        shutdown_shared_scheduler()
@@ -0,0 +1,71 @@
+import hashlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from config.settings import vk_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def source_hash(image_url: str) -> str:
+    """Ключ источника картинки (ссылки pollinations детерминированы: тот же промпт — та же картинка)"""
+    return hashlib.sha256(image_url.encode('utf-8')).hexdigest()
+
+
+class PhotoAttachmentStore:
+    """
+    Постоянный кэш загруженных фото в таблице PhotoAttachmentCache.
+    Повторная публикация той же картинки в ту же группу не качает и не грузит ее заново.
+    Работает только внутри app_context; без него кэш просто пропускается.
+    """
+
+    def __init__(self, ttl_days: int = None):
+        self.ttl = timedelta(days=ttl_days or vk_config.PHOTO_CACHE_TTL_DAYS)
+
+    def lookup(self, image_urls: Iterable[str], owner_id) -> Dict[str, str]:
+        """Одним запросом находит уже загруженные фото: {image_url: attachment}"""
+        from models import PhotoAttachmentCache
+
+        by_hash = {source_hash(url): url for url in image_urls}
+        if not by_hash:
+            return {}
+
+        try:
+            rows = PhotoAttachmentCache.query.filter(
+                PhotoAttachmentCache.owner_id == str(owner_id),
+                PhotoAttachmentCache.source_hash.in_(list(by_hash)),
+                PhotoAttachmentCache.created_at >= datetime.utcnow() - self.ttl
+            ).all()
+        except Exception as e:
+            logger.warning(f"Кэш фото недоступен: {e}")
+            return {}
+
+        return {by_hash[row.source_hash]: row.attachment for row in rows}
+
+    def store(self, entries: List[Tuple[str, str]], owner_id):
+        """Сохраняет [(image_url, attachment), ...] одной транзакцией"""
+        from models import db, PhotoAttachmentCache
+
+        if not entries:
+            return
+
+        try:
+            for image_url, attachment in entries:
+                key = source_hash(image_url)
+                row = PhotoAttachmentCache.query.filter_by(source_hash=key, owner_id=str(owner_id)).first()
+                if row is None:
+                    row = PhotoAttachmentCache(source_hash=key, owner_id=str(owner_id))
+                    db.session.add(row)
+                row.attachment = attachment
+                row.created_at = datetime.utcnow()
+            db.session.commit()
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить фото в кэш: {e}")
+            try:
+                db.session.rollback()
+            except Exception:
+                pass
+
+
+photo_store = PhotoAttachmentStore()
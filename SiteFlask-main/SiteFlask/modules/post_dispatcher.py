@@ -0,0 +1,146 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+import pytz
+
+from config.settings import scheduler_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def local_now() -> datetime:
+    """Текущее время планировщика без tzinfo (в БД publish_date хранится naive)"""
+    return datetime.now(pytz.timezone(scheduler_config.TIMEZONE)).replace(tzinfo=None)
+
+
+class DuePostDispatcher:
+    """
+    Диспетчер публикаций на min-heap.
+    Держит в памяти ближайшие publish_date из таблицы Post и спит ровно до
+    следующего поста. schedule() будит ожидающий поток досрочно.
+    """
+
+    def __init__(self):
+        self._heap = []  # (publish_date, post_id)
+        self._entries: Dict[int, datetime] = {}  # post_id -> актуальная publish_date
+        self._dispatched = set()  # (post_id, publish_date), уже отданные после полной сверки
+        self._cond = threading.Condition()
+        self._loaded = False
+
+    def load_from_db(self) -> int:
+        """Полная пересборка heap из БД (вызывать внутри app_context)"""
+        from models import db, Post
+
+        rows = db.session.query(Post.id, Post.publish_date).filter(
+            Post.status == 'scheduled',
+            Post.publish_date.isnot(None)
+        ).all()
+
+        with self._cond:
+            self._entries = {post_id: publish_date for post_id, publish_date in rows}
+            self._heap = [(publish_date, post_id) for post_id, publish_date in self._entries.items()]
+            heapq.heapify(self._heap)
+            self._dispatched.clear()
+            self._loaded = True
+            self._cond.notify_all()
+
+        logger.info(f"📥 Диспетчер загрузил {len(rows)} запланированных постов")
+        return len(rows)
+
+    def sync_upcoming(self, horizon_seconds: float) -> int:
+        """
+        Дешевая сверка с БД только ближайших постов (до horizon_seconds вперед):
+        посты, запланированные или перенесенные в другом процессе, попадают в heap
+        без полной пересборки. Вызывать внутри app_context. Возвращает число изменений
+        """
+        from models import db, Post
+
+        rows = db.session.query(Post.id, Post.publish_date).filter(
+            Post.status == 'scheduled',
+            Post.publish_date <= local_now() + timedelta(seconds=horizon_seconds)
+        ).all()
+
+        with self._cond:
+            # Уже отданные посты (например, пропущенные из-за мертвого токена) вернет только полная сверка
+            changed = [(post_id, publish_date) for post_id, publish_date in rows
+                       if self._entries.get(post_id) != publish_date
+                       and (post_id, publish_date) not in self._dispatched]
+        for post_id, publish_date in changed:
+            self.schedule(post_id, publish_date)
+        return len(changed)
+
+    def schedule(self, post_id: int, publish_date: Optional[datetime]):
+        """Добавить или перенести пост. Будит ожидающий поток, если пост стал ближайшим"""
+        if not self._loaded or publish_date is None:
+            # Диспетчер не запущен в этом процессе (например, веб-воркер) — пост подхватит сверка с БД
+            return
+
+        with self._cond:
+            self._entries[post_id] = publish_date
+            heapq.heappush(self._heap, (publish_date, post_id))
+            if self._heap[0][1] == post_id:
+                self._cond.notify_all()
+
+    def cancel(self, post_id: int):
+        """Снять пост с расписания (запись в heap удаляется лениво)"""
+        with self._cond:
+            self._entries.pop(post_id, None)
+
+    def wakeup(self):
+        """Разбудить ожидающий поток без новых постов"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._entries)
+
+    def wait_for_due(self, timeout: Optional[float] = None) -> List[int]:
+        """
+        Блокируется до наступления ближайшей publish_date (или до timeout).
+        Возвращает ID постов, время которых пришло; пустой список — если вышел timeout.
+        """
+        deadline = time.monotonic() + timeout if timeout is not None else None
+
+        with self._cond:
+            while True:
+                self._drop_stale()
+                now = local_now()
+
+                if self._heap and self._heap[0][0] <= now:
+                    return self._pop_due(now)
+
+                wait = (self._heap[0][0] - now).total_seconds() if self._heap else None
+                if deadline is not None:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return []
+                    wait = remaining if wait is None else min(wait, remaining)
+
+                self._cond.wait(wait)
+
+    def _drop_stale(self):
+        """Убирает с вершины heap отмененные и перенесенные записи"""
+        while self._heap:
+            publish_date, post_id = self._heap[0]
+            if self._entries.get(post_id) == publish_date:
+                return
+            heapq.heappop(self._heap)
+
+    def _pop_due(self, now: datetime) -> List[int]:
+        due_ids = []
+        while self._heap and self._heap[0][0] <= now:
+            publish_date, post_id = heapq.heappop(self._heap)
+            if self._entries.get(post_id) == publish_date:
+                del self._entries[post_id]
+                self._dispatched.add((post_id, publish_date))
+                due_ids.append(post_id)
+        return due_ids
+
+
+# Глобальный экземпляр диспетчера на процесс
+post_dispatcher = DuePostDispatcher()
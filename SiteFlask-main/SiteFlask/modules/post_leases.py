@@ -0,0 +1,166 @@
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import List
+
+from config.settings import daemon_config
+from modules.post_dispatcher import local_now
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class PostLeaseManager:
+    """
+    Атомарный захват постов репликами демона.
+    Пост переводится из 'scheduled' в 'publishing' условным UPDATE (работает одинаково
+    на SQLite и Postgres), а владелец и срок аренды пишутся в PostLease в той же транзакции.
+    Пока пачка публикуется, аренда продлевается в фоне (keep_alive), а результат
+    записывается только под условным UPDATE (hold). Аренды упавших реплик истекают,
+    и посты возвращаются в 'scheduled'.
+    """
+
+    def __init__(self, owner: str = None, lease_seconds: int = None):
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds or daemon_config.LEASE_SECONDS
+
+    def claim(self, post_ids: List[int]) -> List[int]:
+        """Захватывает посты из списка. Возвращает только те, что достались этой реплике"""
+        from models import db, Post, PostLease
+
+        claimed = []
+        expires_at = local_now() + timedelta(seconds=self.lease_seconds)
+        try:
+            for post_id in post_ids:
+                # publish_date проверяем здесь же: устаревшая запись heap не опубликует пост раньше времени
+                updated = Post.query.filter(
+                    Post.id == post_id,
+                    Post.status == 'scheduled',
+                    Post.publish_date <= local_now()
+                ).update({'status': 'publishing'}, synchronize_session=False)
+
+                if updated:
+                    db.session.merge(PostLease(post_id=post_id, owner=self.owner, expires_at=expires_at))
+                    claimed.append(post_id)
+
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка захвата постов: {e}")
+            db.session.rollback()
+            return []
+
+        if len(claimed) < len(post_ids):
+            logger.info(f"🔒 Захвачено {len(claimed)} из {len(post_ids)} постов (остальные у других реплик)")
+        return claimed
+
+    def owns(self, post_id: int) -> bool:
+        """Проверяет, что аренда поста все еще принадлежит этой реплике"""
+        from models import PostLease
+
+        lease = PostLease.query.get(post_id)
+        return lease is not None and lease.owner == self.owner and lease.expires_at > local_now()
+
+    def renew(self, post_ids: List[int]) -> int:
+        """Продлевает аренду постов этой реплики. Возвращает число продленных аренд"""
+        from models import db, PostLease
+
+        try:
+            renewed = PostLease.query.filter(
+                PostLease.post_id.in_(post_ids),
+                PostLease.owner == self.owner
+            ).update(
+                {'expires_at': local_now() + timedelta(seconds=self.lease_seconds)},
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка продления аренды: {e}")
+            db.session.rollback()
+            return 0
+        return renewed
+
+    @contextmanager
+    def keep_alive(self, post_ids: List[int]):
+        """
+        Продлевает аренду постов в фоновом потоке, пока идет публикация
+        (загрузка фото пачки может длиться дольше срока аренды).
+        Вызывать внутри app_context: поток работает в контексте того же приложения.
+        """
+        from flask import current_app
+
+        app = current_app._get_current_object()
+        stop = threading.Event()
+
+        def heartbeat():
+            with app.app_context():
+                while not stop.wait(self.lease_seconds / 3):
+                    if not self.renew(post_ids):
+                        logger.warning(f"Аренда постов {post_ids} потеряна, продление остановлено")
+                        return
+
+        thread = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def hold(self, post_id: int) -> bool:
+        """
+        Условный UPDATE перед записью результата: пост все еще 'publishing' и аренда у этой реплики.
+        Строка остается заблокированной до коммита, поэтому reap_expired другой реплики
+        не вернет пост в 'scheduled' между проверкой и записью статуса.
+        """
+        from models import db, Post, PostLease
+
+        owned = db.session.query(PostLease.post_id).filter(
+            PostLease.post_id == post_id,
+            PostLease.owner == self.owner
+        ).exists()
+        updated = Post.query.filter(
+            Post.id == post_id,
+            Post.status == 'publishing',
+            owned
+        ).update({'status': 'publishing'}, synchronize_session=False)
+        return bool(updated)
+
+    def release(self, post_id: int):
+        """Снимает аренду. Коммит делает вызывающий код вместе со сменой статуса поста"""
+        from models import PostLease
+
+        PostLease.query.filter_by(post_id=post_id, owner=self.owner).delete(synchronize_session=False)
+
+    def reap_expired(self) -> int:
+        """
+        Возвращает в 'scheduled' посты с истекшей арендой. Возвращает их число.
+        Истечение проверяется в самом UPDATE, а не отдельным SELECT перед ним:
+        аренду, продленную keep_alive между запросами, сброс не заденет.
+        """
+        from models import db, Post, PostLease
+
+        now = local_now()
+        try:
+            expired = db.session.query(PostLease.post_id).filter(
+                PostLease.post_id == Post.id,
+                PostLease.expires_at < now
+            ).correlate(Post).exists()
+            reset = Post.query.filter(
+                Post.status == 'publishing',
+                expired
+            ).update({'status': 'scheduled'}, synchronize_session=False)
+            PostLease.query.filter(
+                PostLease.expires_at < now
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка освобождения просроченных аренд: {e}")
+            db.session.rollback()
+            return 0
+
+        if reset:
+            logger.warning(f"♻️ Истекла аренда {reset} постов, возвращаю в очередь")
+        return reset
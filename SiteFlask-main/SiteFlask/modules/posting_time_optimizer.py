@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+
+import numpy as np
+
+from config.settings import scheduler_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+DAYS_PER_WEEK = 7
+HOURS_PER_DAY = 24
+WEEKDAYS = ['Пн', 'Вт', 'Ср', 'Чт', 'Пт', 'Сб', 'Вс']
+
+
+class PostingTimeOptimizer:
+    """
+    Подбор времени публикации по истории аккаунта: матрица 7x24 (день недели x час)
+    со средней относительной вовлеченностью постов, опубликованных в этот час.
+    Матрица сглаживается по соседним часам и стягивается к среднему по аккаунту,
+    чтобы час с одним удачным постом не перевешивал стабильные слоты.
+    """
+
+    def __init__(self, min_posts: int = None, lookback_days: int = None,
+                 smoothing_hours: float = None, prior_posts: float = None):
+        self.min_posts = min_posts or scheduler_config.OPTIMIZER_MIN_POSTS
+        self.lookback_days = lookback_days or scheduler_config.OPTIMIZER_LOOKBACK_DAYS
+        self.smoothing_hours = scheduler_config.OPTIMIZER_SMOOTHING_HOURS if smoothing_hours is None else smoothing_hours
+        self.prior_posts = scheduler_config.OPTIMIZER_PRIOR_POSTS if prior_posts is None else prior_posts
+
+    def load_history(self, business_info: Dict) -> List[Tuple]:
+        """[(publish_date, views, likes, comments, shares), ...] опубликованных постов аккаунта"""
+        from models import db, Post
+
+        query = db.session.query(
+            Post.publish_date, Post.views, Post.likes, Post.comments, Post.shares
+        ).filter(
+            Post.is_published == True,
+            Post.publish_date >= datetime.now() - timedelta(days=self.lookback_days)
+        )
+        if business_info.get('vk_account_id'):
+            query = query.filter(Post.vk_account_id == business_info['vk_account_id'])
+        elif business_info.get('user_id'):
+            query = query.filter(Post.user_id == business_info['user_id'])
+        else:
+            return []
+        return query.all()
+
+    @staticmethod
+    def post_scores(metrics: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Оценка поста — среднее его метрик, отнесенных к средним по аккаунту
+        (1.0 — обычный пост). Так просмотры и лайки сопоставимы по масштабу.
+        """
+        means = metrics.mean(axis=0)
+        columns = means > 0
+        if not columns.any():
+            return None
+        return (metrics[:, columns] / means[columns]).mean(axis=1)
+
+    def _smooth(self, values: np.ndarray) -> np.ndarray:
+        """Гауссово сглаживание по кругу часов недели (вс 23:00 соседствует с пн 00:00)"""
+        if self.smoothing_hours <= 0:
+            return values
+        radius = int(math.ceil(3 * self.smoothing_hours))
+        result = np.zeros_like(values)
+        for offset in range(-radius, radius + 1):
+            weight = math.exp(-offset ** 2 / (2 * self.smoothing_hours ** 2))
+            result += weight * np.roll(values, offset)
+        return result
+
+    def engagement_matrix(self, history: Sequence[Tuple]) -> Optional[np.ndarray]:
+        """Матрица 7x24 или None, если истории мало для выводов"""
+        history = [row for row in history if row[0] is not None]
+        if len(history) < self.min_posts:
+            return None
+
+        slots = np.array([d.weekday() * HOURS_PER_DAY + d.hour for d, *_ in history])
+        metrics = np.array([[value or 0 for value in row[1:]] for row in history], dtype=float)
+        scores = self.post_scores(metrics)
+        if scores is None:
+            return None
+
+        hours_per_week = DAYS_PER_WEEK * HOURS_PER_DAY
+        sums = np.bincount(slots, weights=scores, minlength=hours_per_week)
+        counts = np.bincount(slots, minlength=hours_per_week).astype(float)
+
+        sums, counts = self._smooth(sums), self._smooth(counts)
+        overall = scores.mean()
+        matrix = (sums + self.prior_posts * overall) / (counts + self.prior_posts)
+        return matrix.reshape(DAYS_PER_WEEK, HOURS_PER_DAY)
+
+    def matrix_for(self, business_info: Dict) -> Optional[np.ndarray]:
+        try:
+            return self.engagement_matrix(self.load_history(business_info))
+        except Exception as e:
+            logger.error(f"Ошибка расчета матрицы вовлеченности: {e}")
+            return None
+
+    @staticmethod
+    def top_slots(matrix: np.ndarray, n: int = 3) -> List[Tuple[int, int]]:
+        """n лучших слотов недели [(день недели, час), ...]"""
+        flat = np.argsort(matrix, axis=None)[::-1][:n]
+        return [(int(index) // HOURS_PER_DAY, int(index) % HOURS_PER_DAY) for index in flat]
+
+    @staticmethod
+    def next_slot(matrix: np.ndarray, day: datetime, not_before: datetime) -> datetime:
+        """Лучший час дня day; если он уже прошел — лучший час следующего дня"""
+        date = day.replace(hour=0, minute=0, second=0, microsecond=0)
+        while True:
+            slot = date.replace(hour=int(np.argmax(matrix[date.weekday()])))
+            if slot >= not_before:
+                return slot
+            date += timedelta(days=1)
+
+    def next_slots(self, matrix: np.ndarray, count: int, start: datetime, now: datetime) -> List[datetime]:
+        """
+        Слоты для пачки из count постов: лучший час дня, начиная со start, не раньше now.
+        Каждый следующий пост идет строго после предыдущего — в лучший час следующего дня.
+        """
+        slots = []
+        day, not_before = start, now
+        for _ in range(count):
+            slot = self.next_slot(matrix, day, not_before)
+            slots.append(slot)
+            day = slot + timedelta(days=1)
+            not_before = slot + timedelta(minutes=1)
+        return slots
+
+    @staticmethod
+    def describe(slots: List[Tuple[int, int]]) -> str:
+        return ', '.join(f"{WEEKDAYS[weekday]} {hour:02d}:00" for weekday, hour in slots)
+
+
+posting_time_optimizer = PostingTimeOptimizer()
@@ -0,0 +1,89 @@
+import random
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config.settings import daemon_config
+from modules.post_dispatcher import local_now
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Коды VK, после которых публикацию имеет смысл повторить:
+# 1 — неизвестная ошибка, 6 — слишком много запросов, 9 — flood control, 10 — внутренняя ошибка VK
+TRANSIENT_VK_ERRORS = {1, 6, 9, 10}
+
+
+def is_retryable(result: Dict) -> bool:
+    """
+    Классификация ошибки публикации: временная (повторяем) или постоянная.
+    Сетевые ошибки помечаются retryable только для постов с guid (см. VKontakteAPI._network_error_result)
+    """
+    if result.get('retryable'):
+        return True
+    error = result.get('error')
+    if isinstance(error, dict):
+        return error.get('error_code') in TRANSIENT_VK_ERRORS
+    return False
+
+
+def backoff_delay(attempt: int) -> float:
+    """Экспоненциальная задержка с jitter: половина фиксированная, половина случайная"""
+    delay = min(daemon_config.RETRY_MAX_DELAY, daemon_config.RETRY_BASE_DELAY * 2 ** (attempt - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class PublishRetryPolicy:
+    """
+    Решает, что делать с постом после неудачной публикации:
+    'scheduled' — повтор через backoff, 'dead' — исчерпан лимит попыток,
+    'failed' — постоянная ошибка (токен, права, контент).
+    """
+
+    def __init__(self, max_attempts: int = None):
+        self.max_attempts = max_attempts or daemon_config.MAX_PUBLISH_ATTEMPTS
+
+    def handle_failure(self, db_post, result: Dict) -> str:
+        """Меняет статус/publish_date поста. Коммит делает вызывающий код"""
+        from models import db, PostRetry
+
+        if not is_retryable(result):
+            db_post.status = 'failed'
+            return db_post.status
+
+        retry = PostRetry.query.get(db_post.id)
+        if retry is None:
+            retry = PostRetry(post_id=db_post.id, attempts=0, original_publish_date=db_post.publish_date)
+            db.session.add(retry)
+
+        retry.attempts += 1
+        retry.last_error = str(result.get('error'))[:1000]
+
+        if retry.attempts >= self.max_attempts:
+            db_post.status = 'dead'
+            retry.next_attempt_at = None
+            logger.error(f"☠️ Пост {db_post.id}: {retry.attempts} неудачных попыток, перенесен в dead-letter")
+            return db_post.status
+
+        next_attempt_at = local_now() + timedelta(seconds=backoff_delay(retry.attempts))
+        retry.next_attempt_at = next_attempt_at
+        db_post.publish_date = next_attempt_at
+        db_post.status = 'scheduled'
+        logger.warning(
+            f"🔁 Пост {db_post.id}: временная ошибка, попытка {retry.attempts + 1} "
+            f"в {next_attempt_at.strftime('%H:%M:%S')}"
+        )
+        return db_post.status
+
+    def original_publish_date(self, db_post) -> Optional[datetime]:
+        """Исходная publish_date (до переносов повторами)"""
+        from models import PostRetry
+
+        retry = PostRetry.query.get(db_post.id)
+        if retry and retry.original_publish_date:
+            return retry.original_publish_date
+        return db_post.publish_date
+
+    def handle_success(self, db_post):
+        from models import PostRetry
+
+        PostRetry.query.filter_by(post_id=db_post.id).delete(synchronize_session=False)
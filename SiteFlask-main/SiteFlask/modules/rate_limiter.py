@@ -0,0 +1,91 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+from config.settings import vk_config
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket: rate токенов в секунду, не больше capacity в запасе"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self) -> float:
+        """Берет токен, если он есть. Возвращает 0 при успехе или сколько секунд ждать"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Блокируется, пока не появится свободный токен"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """То же для asyncio: ждет токен, не блокируя цикл событий"""
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+
+class TokenBucketRegistry:
+    """Отдельный bucket на каждый ключ (для VK — на каждый access_token)"""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def get_bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, key: Optional[str]):
+        if not key:
+            return
+        self.get_bucket(key).acquire()
+
+    async def acquire_async(self, key: Optional[str]):
+        if not key:
+            return
+        await self.get_bucket(key).acquire_async()
+
+
+def per_process_limits(rate: float, burst: int, processes: int):
+    """
+    Доля лимита на один процесс. Bucket живет в памяти процесса, а лимит VK общий
+    для всех процессов с тем же токеном, поэтому rate и запас делятся на их число
+    (VK_RATE_LIMIT_PROCESSES) — в сумме процессы не превышают лимит и не ловят ошибку 6.
+    """
+    processes = max(1, processes)
+    return rate / processes, max(1, burst // processes)
+
+
+# Лимитер VK-запросов процесса: его доля от ~3 запросов в секунду на токен
+vk_rate_limiter = TokenBucketRegistry(*per_process_limits(
+    vk_config.RATE_LIMIT_PER_SECOND, vk_config.RATE_LIMIT_BURST, vk_config.RATE_LIMIT_PROCESSES
+))
@@ -0,0 +1,69 @@
+import queue
+import threading
+from typing import Callable, Hashable
+
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ReplenishmentPool:
+    """
+    Фоновый пул генерации контента со своей очередью задач.
+    Цикл публикации только ставит задачи и никогда не ждет LLM.
+    На один ключ (аккаунт) в очереди или в работе может быть только одна задача.
+    """
+
+    def __init__(self, workers: int, queue_size: int = 0, name: str = "replenish"):
+        self._jobs = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._threads = []
+
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: Hashable, func: Callable, *args, **kwargs) -> bool:
+        """Ставит задачу в очередь. False — если задача по ключу уже есть или очередь полна"""
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        try:
+            self._jobs.put_nowait((key, func, args, kwargs))
+        except queue.Full:
+            with self._lock:
+                self._pending.discard(key)
+            logger.warning(f"Очередь генерации переполнена, задача {key} отложена до следующей проверки")
+            return False
+        return True
+
+    def is_pending(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._pending
+
+    def queue_size(self) -> int:
+        return self._jobs.qsize()
+
+    def shutdown(self):
+        """Останавливает воркеры после текущих задач (оставшиеся в очереди не выполняются)"""
+        for _ in self._threads:
+            self._jobs.put((None, None, (), {}))
+        for thread in self._threads:
+            thread.join()
+
+    def _worker(self):
+        while True:
+            key, func, args, kwargs = self._jobs.get()
+            if func is None:
+                return
+            try:
+                func(*args, **kwargs)
+            except Exception as e:
+                logger.error(f"Ошибка фоновой генерации ({key}): {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
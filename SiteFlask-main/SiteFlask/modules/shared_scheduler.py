@@ -0,0 +1,68 @@
+import atexit
+import threading
+from typing import Optional
+
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.base import STATE_PAUSED
+
+from config.settings import scheduler_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+_scheduler: Optional[BackgroundScheduler] = None
+_lock = threading.Lock()
+
+
+def get_shared_scheduler() -> BackgroundScheduler:
+    """
+    Единый BackgroundScheduler на процесс.
+    Задачи хранятся в БД (SQLAlchemyJobStore), поэтому при старте процесса
+    планировщик сам поднимает их из базы, а не теряет на рестарте.
+    Выполняет задачи только процесс-исполнитель (см. run_jobs_in_this_process),
+    в остальных планировщик запущен на паузе и лишь добавляет/меняет задачи в хранилище.
+    """
+    global _scheduler
+    with _lock:
+        if _scheduler is None:
+            _scheduler = BackgroundScheduler(
+                jobstores={'default': SQLAlchemyJobStore(url=scheduler_config.JOBSTORE_URL)},
+                job_defaults={
+                    'coalesce': True,
+                    'misfire_grace_time': scheduler_config.MISFIRE_GRACE_TIME
+                },
+                timezone=scheduler_config.TIMEZONE
+            )
+            # На паузе задачи пишутся в хранилище, но не выполняются
+            _scheduler.start(paused=scheduler_config.RUN_JOBS is not True)
+            atexit.register(shutdown_shared_scheduler)
+            mode = "выполняет задачи" if scheduler_config.RUN_JOBS else "только пишет задачи"
+            logger.info(f"🗓 Общий планировщик запущен и {mode}, задач в хранилище: {len(_scheduler.get_jobs())}")
+        return _scheduler
+
+
+def run_jobs_in_this_process():
+    """
+    Делает процесс исполнителем задач общего планировщика (вызывает демон публикаций).
+    SCHEDULER_RUN_JOBS=0 отключает это, например, на второй и следующих репликах демона.
+    """
+    if scheduler_config.RUN_JOBS is False:
+        logger.info("🗓 SCHEDULER_RUN_JOBS=0: задачи планировщика выполняет другой процесс")
+        return
+
+    scheduler = get_shared_scheduler()
+    with _lock:
+        if scheduler.state == STATE_PAUSED:
+            scheduler.resume()
+            logger.info(f"🗓 Процесс выполняет задачи планировщика, в хранилище: {len(scheduler.get_jobs())}")
+
+
+def shutdown_shared_scheduler():
+    """Остановка общего планировщика (задачи остаются в БД)"""
+    global _scheduler
+    with _lock:
+        if _scheduler is not None and _scheduler.running:
+            _scheduler.shutdown(wait=False)
+            logger.info("Планировщик остановлен")
+        _scheduler = None
@@ -1,10 +1,61 @@
+import asyncio
+import json
+import uuid
 import requests
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
 from abc import ABC, abstractmethod
+from config.settings import vk_config
+from modules.vk_transport import vk_transport
+from modules.photo_cache import photo_store
+from utils.ttl_cache import TTLCache
 from utils.logger import get_logger
+from utils.metrics import VK_REQUEST_DURATION
 
 logger = get_logger(__name__)
 
+EXECUTE_BATCH_SIZE = 25  # Максимум вызовов API в одном execute
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Общий пул загрузки фото: ограничивает параллельные загрузки на весь процесс
+_upload_executor = ThreadPoolExecutor(max_workers=vk_config.PHOTO_UPLOAD_WORKERS, thread_name_prefix="vk-upload")
+
+# Пул для синхронных API без своей async-реализации (publish_async по умолчанию)
+_sync_publish_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="publish-sync")
+
+# Адреса getWallUploadServer живут недолго, но переиспользуются между постами группы
+_upload_servers = TTLCache(maxsize=1000, ttl=vk_config.UPLOAD_SERVER_TTL)
+
+
+class _MultipartStream:
+    """
+    Тело multipart/form-data, которое читает файл из ответа-источника по частям.
+    Если размер источника известен, requests отправит Content-Length, иначе — chunked.
+    """
+
+    def __init__(self, source, field: str, filename: str, content_type: str):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self._source = source
+        self._head = (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f"Content-Type: {content_type}\r\n\r\n"
+        ).encode('utf-8')
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode('utf-8')
+
+        # Content-Length источника верен, только если ответ не сжат (iter_content распаковывает)
+        source_length = source.headers.get('Content-Length')
+        if source_length and not source.headers.get('Content-Encoding'):
+            self.len = len(self._head) + int(source_length) + len(self._tail)
+
+    def __iter__(self):
+        yield self._head
+        for chunk in self._source.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+            if chunk:
+                yield chunk
+        yield self._tail
+
 class SocialMediaAPI(ABC):
     """Базовый класс для API социальных сетей"""
     
@@ -13,13 +64,21 @@ class SocialMediaAPI(ABC):
         """Публикация контента"""
         pass
 
+    async def publish_async(self, content: Dict, business_info: Dict) -> Dict:
+        """Асинхронная публикация. По умолчанию — синхронный publish в отдельном потоке"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_sync_publish_executor, self.publish, content, business_info)
+
 class SocialMediaPublisher:
     """Универсальный публикатор для всех соцсетей"""
     
     def __init__(self):
         # Здесь мы регистрируем все доступные API
+        from modules.vk_async import AsyncVKontakteAPI
+
         self.apis = {
-            'vk': VKontakteAPI(),
+            # Умеет и синхронный publish (для Flask-маршрутов), и publish_async
+            'vk': AsyncVKontakteAPI(),
             # Если добавишь TelegramAPI, его нужно будет вписать сюда
         }
     
@@ -33,50 +92,111 @@ class SocialMediaPublisher:
         
         # Вызываем метод publish у конкретного API (например, у VKontakteAPI)
         return api.publish(content, business_info)
+
+    def publish_many(self, platform: str, items: List[Tuple[Dict, Dict]]) -> List[Dict]:
+        """Пакетная публикация [(content, business_info), ...] на одной платформе"""
+        api = self.apis.get(platform)
+
+        if not api:
+            logger.error(f"API для платформы {platform} не найден")
+            return [{'success': False, 'error': f'Platform {platform} not supported'} for _ in items]
+
+        if hasattr(api, 'publish_many'):
+            return api.publish_many(items)
+        return [api.publish(content, business_info) for content, business_info in items]
+
+    async def publish_async(self, platform: str, content: Dict, business_info: Dict) -> Dict:
+        """Асинхронная публикация: один цикл событий ведет много публикаций одновременно"""
+        api = self.apis.get(platform)
+
+        if not api:
+            logger.error(f"API для платформы {platform} не найден")
+            return {'success': False, 'error': f'Platform {platform} not supported'}
+
+        return await api.publish_async(content, business_info)
+
+    async def publish_many_async(self, platform: str, items: List[Tuple[Dict, Dict]]) -> List[Dict]:
+        """Асинхронная пакетная публикация [(content, business_info), ...]"""
+        api = self.apis.get(platform)
+
+        if not api:
+            logger.error(f"API для платформы {platform} не найден")
+            return [{'success': False, 'error': f'Platform {platform} not supported'} for _ in items]
+
+        if hasattr(api, 'publish_many_async'):
+            return await api.publish_many_async(items)
+        return list(await asyncio.gather(*(api.publish_async(c, b) for c, b in items)))
+
+    async def aclose(self):
+        """Закрывает сетевые сессии async-клиентов (вызывать в том же цикле событий)"""
+        for api in self.apis.values():
+            if hasattr(api, 'close'):
+                await api.close()
     
 class VKontakteAPI(SocialMediaAPI):
     """API ВКонтакте (С поддержкой загрузки фото)"""
     
     def __init__(self):
-        self.api_version = "5.199"
+        self.api_version = vk_config.API_VERSION
+
+    def _call_method(self, method: str, params: Dict, http_method: str = 'get') -> Dict:
+        """Вызов метода VK API через общий транспорт (пул соединений, таймауты, лимит на токен)"""
+        return vk_transport.call(method, params, http_method=http_method)
     
-    def _upload_photo(self, image_url, access_token, group_id):
-        """Вспомогательный метод: Скачивает фото по ссылке и грузит в VK"""
-        try:
-            # 1. Получаем адрес сервера для загрузки
-            server_url = "https://api.vk.com/method/photos.getWallUploadServer"
-            server_resp = requests.get(server_url, params={
-                'access_token': access_token,
-                'group_id': group_id,
-                'v': self.api_version
-            }).json()
+    def _get_upload_server(self, access_token, group_id):
+        """Адрес сервера VK для загрузки фото на стену группы (с коротким TTL-кэшем)"""
+        cached = _upload_servers.get((access_token, group_id))
+        if cached:
+            return cached
 
-            if 'error' in server_resp:
-                logger.error(f"VK Upload Server Error: {server_resp['error']}")
-                return None
+        server_resp = self._call_method('photos.getWallUploadServer', {
+            'access_token': access_token,
+            'group_id': group_id,
+            'v': self.api_version
+        })
 
-            upload_url = server_resp['response']['upload_url']
+        if 'error' in server_resp:
+            logger.error(f"VK Upload Server Error: {server_resp['error']}")
+            return None
 
-            # 2. Скачиваем картинку (байты)
-            img_data = requests.get(image_url).content
+        upload_url = server_resp['response']['upload_url']
+        _upload_servers.set((access_token, group_id), upload_url)
+        return upload_url
 
-            # 3. Отправляем файл на сервер VK
-            files = {'photo': ('image.jpg', img_data, 'image/jpeg')}
-            upload_resp = requests.post(upload_url, files=files).json()
+    def _stream_to_upload_server(self, image_url, upload_url) -> Dict:
+        """Скачивание картинки сразу в multipart-запрос к VK, без буфера на весь файл"""
+        with vk_transport.get(image_url, stream=True) as source:
+            source.raise_for_status()
+            body = _MultipartStream(source, field='photo', filename='image.jpg', content_type='image/jpeg')
+            with VK_REQUEST_DURATION.time(method='photo.upload'):
+                upload_resp = vk_transport.post(upload_url, data=body, headers={'Content-Type': body.content_type}).json()
+            return upload_resp
+
+    def _upload_photo(self, image_url, access_token, group_id, upload_url=None):
+        """Вспомогательный метод: Скачивает фото по ссылке и грузит в VK (без кэша)"""
+        try:
+            # 1. Получаем адрес сервера для загрузки (если не передан)
+            upload_url = upload_url or self._get_upload_server(access_token, group_id)
+            if not upload_url:
+                return None
+
+            # 2-3. Скачиваем картинку и потоком отправляем файл на сервер VK
+            upload_resp = self._stream_to_upload_server(image_url, upload_url)
 
             # 4. Сохраняем фото в альбом группы
-            save_url = "https://api.vk.com/method/photos.saveWallPhoto"
-            save_resp = requests.post(save_url, params={
+            save_resp = self._call_method('photos.saveWallPhoto', {
                 'access_token': access_token,
                 'group_id': group_id,
                 'photo': upload_resp['photo'],
                 'server': upload_resp['server'],
                 'hash': upload_resp['hash'],
                 'v': self.api_version
-            }).json()
+            }, http_method='post')
             
             if 'error' in save_resp:
                 logger.error(f"VK Save Photo Error: {save_resp['error']}")
+                # Адрес сервера мог протухнуть раньше TTL
+                _upload_servers.pop((access_token, group_id))
                 return None
 
             # 5. Возвращаем ID вложения (photo-GROUP_ID_PHOTO_ID)
@@ -87,50 +207,233 @@ class VKontakteAPI(SocialMediaAPI):
             logger.error(f"Critical upload error: {e}")
             return None
 
+    def _upload_photos(self, image_urls: List[str], access_token, group_id) -> List[str]:
+        """
+        Загрузка нескольких фото одного поста параллельно. Порядок вложений сохраняется.
+        Фото, уже загруженные в эту группу, берутся из кэша без скачивания и загрузки.
+        """
+        cached = photo_store.lookup(image_urls, group_id)
+        missing = [url for url in image_urls if url not in cached]
+
+        if len(missing) == 1:
+            uploaded = [self._upload_photo(missing[0], access_token, group_id)]
+        elif missing:
+            # Один адрес сервера на все фото поста
+            upload_url = self._get_upload_server(access_token, group_id)
+            if not upload_url:
+                uploaded = [None] * len(missing)
+            else:
+                futures = [
+                    _upload_executor.submit(self._upload_photo, image_url, access_token, group_id, upload_url)
+                    for image_url in missing
+                ]
+                uploaded = [f.result() for f in futures]
+        else:
+            uploaded = []
+
+        new_entries = []
+        for image_url, attachment in zip(missing, uploaded):
+            if attachment:
+                cached[image_url] = attachment
+                new_entries.append((image_url, attachment))
+        photo_store.store(new_entries, group_id)
+
+        if len(cached) > len(new_entries):
+            logger.info(f"♻️ Фото из кэша: {len(cached) - len(new_entries)} шт.")
+        return [cached[url] for url in image_urls if url in cached]
+
+    def execute_batch(self, access_token: str, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        """
+        Выполняет вызовы через метод execute (до 25 за один запрос).
+        Возвращает по элементу на каждый вызов в том же порядке: {'response': ...} или {'error': ...}.
+        Сетевые ошибки пробрасываются наружу (requests.RequestException).
+        """
+        results = []
+        for start in range(0, len(calls), EXECUTE_BATCH_SIZE):
+            chunk = calls[start:start + EXECUTE_BATCH_SIZE]
+            resp = self._call_method('execute', {
+                'access_token': access_token,
+                'v': self.api_version,
+                'code': self._execute_code(chunk)
+            }, http_method='post')
+            results.extend(self._parse_execute(resp, chunk))
+        return results
+
+    @staticmethod
+    def _execute_code(chunk: List[Tuple[str, Dict]]) -> str:
+        """VKScript, возвращающий массив результатов вызовов пачки"""
+        return "return [" + ",".join(
+            f"API.{method}({json.dumps(params, ensure_ascii=False)})" for method, params in chunk
+        ) + "];"
+
+    @staticmethod
+    def _parse_execute(resp: Dict, chunk: List[Tuple[str, Dict]]) -> List[Dict]:
+        """Раскладывает ответ execute по вызовам пачки"""
+        if 'error' in resp:
+            # Ошибка всего execute (токен, лимит) относится к каждому вызову пачки
+            return [{'error': resp['error']} for _ in chunk]
+
+        results = []
+        values = resp.get('response') or []
+        errors = list(resp.get('execute_errors', []))
+        for i, (method, _) in enumerate(chunk):
+            value = values[i] if i < len(values) else False
+            if value is False:
+                # Ошибки в execute_errors идут в порядке выполнения вызовов
+                error = next((e for e in errors if e.get('method') == method), None)
+                if error:
+                    errors.remove(error)
+                results.append({'error': error or {'error_code': 1, 'error_msg': 'Empty execute result'}})
+            else:
+                results.append({'response': value})
+        return results
+
+    def _execute_grouped(self, accounts: List[Tuple[str, str]], make_call) -> List[Dict]:
+        """Группирует вызовы по токену и выполняет каждую группу через execute"""
+        results = [None] * len(accounts)
+        by_token = {}
+        for i, (group_id, access_token) in enumerate(accounts):
+            by_token.setdefault(access_token, []).append(i)
+
+        for access_token, indexes in by_token.items():
+            try:
+                batch = self.execute_batch(access_token, [make_call(accounts[i][0]) for i in indexes])
+            except Exception as e:
+                logger.error(f"Ошибка пакетного запроса к VK: {e}")
+                batch = [{'error': {'error_code': 1, 'error_msg': str(e)}}] * len(indexes)
+            for i, result in zip(indexes, batch):
+                results[i] = result
+        return results
+
+    def fetch_stats_many(self, accounts: List[Tuple[str, str]], **stats_params) -> List[Dict]:
+        """stats.get для многих групп [(group_id, access_token), ...] пачками через execute"""
+        return self._execute_grouped(
+            accounts,
+            lambda group_id: ('stats.get', {'group_id': group_id, **stats_params})
+        )
+
+    def fetch_groups_info_many(self, accounts: List[Tuple[str, str]], fields: str = 'members_count') -> List[Dict]:
+        """groups.getById для многих групп. Элемент результата: {'response': group} или {'error': ...}"""
+        return self._unwrap_groups(self._execute_grouped(
+            accounts,
+            lambda group_id: ('groups.getById', {'group_id': group_id, 'fields': fields})
+        ))
+
+    @staticmethod
+    def _unwrap_groups(results: List[Dict]) -> List[Dict]:
+        for result in results:
+            response = result.get('response')
+            if isinstance(response, dict):
+                # Начиная с 5.139 ответ обернут в {'groups': [...]}
+                response = response.get('groups', [])
+            if 'response' in result:
+                result['response'] = response[0] if response else None
+        return results
+
+    def _prepare_wall_params(self, content: Dict, business_info: Dict) -> Tuple[Dict, List[str]]:
+        """Параметры wall.post без вложений и список картинок, которые нужно загрузить"""
+        group_id = business_info.get('vk_group_id')
+        params = {
+            'owner_id': f"-{group_id}",
+            'from_group': 1,
+            'message': f"{content.get('title', '')}\n\n{content.get('text', '')}"
+        }
+
+        # Если есть дата публикации (отложенный пост в самом VK)
+        if content.get('publish_date'):
+            params['publish_date'] = content.get('publish_date')
+
+        # wall.post не идемпотентен: с guid VK не создаст второй пост при повторе (в течение часа)
+        if content.get('guid'):
+            params['guid'] = content['guid']
+
+        image_urls = list(content.get('image_urls') or [])
+        if content.get('image_url') and content['image_url'] not in image_urls:
+            image_urls.insert(0, content['image_url'])
+        return params, image_urls
+
+    def _build_wall_params(self, content: Dict, business_info: Dict) -> Dict:
+        """Параметры wall.post без access_token и v (фото загружается заранее)"""
+        params, image_urls = self._prepare_wall_params(content, business_info)
+
+        # --- ОБРАБОТКА ИЗОБРАЖЕНИЙ ---
+        if image_urls:
+            logger.info(f"📸 Загружаю фото в VK ({len(image_urls)} шт.)...")
+            attachments = self._upload_photos(
+                image_urls, 
+                business_info.get('access_token'), 
+                business_info.get('vk_group_id')
+            )
+            if attachments:
+                params['attachments'] = ','.join(attachments)
+        # -----------------------------
+        return params
+
+    @staticmethod
+    def _network_error_result(error: Exception, content: Dict) -> Dict:
+        """
+        Результат при сетевой ошибке (таймаут, обрыв). VK мог уже принять пост,
+        поэтому повторять публикацию безопасно, только если передан guid.
+        """
+        return {'success': False, 'error': str(error), 'retryable': bool(content.get('guid'))}
+
+    def _wall_post_result(self, result: Dict) -> Dict:
+        if 'error' in result:
+            logger.error(f"VK API Error: {result['error']}")
+            return {'success': False, 'error': result['error']}
+
+        post_id = result['response']['post_id']
+        logger.info(f"✅ Пост опубликован в VK, ID: {post_id}")
+        return {'success': True, 'post_id': post_id}
+
     def publish(self, content: Dict, business_info: Dict) -> Dict:
         """Публикация в VK"""
         try:
-            group_id = business_info.get('vk_group_id')
             access_token = business_info.get('access_token')
             
             if not access_token:
                 return {'success': False, 'error': 'No access token provided'}
 
-            params = {
-                'access_token': access_token,
-                'v': self.api_version,
-                'owner_id': f"-{group_id}",
-                'from_group': 1,
-                'message': f"{content.get('title', '')}\n\n{content.get('text', '')}"
-            }
-
-            # Если есть дата публикации (отложенный пост в самом VK)
-            if content.get('publish_date'):
-                params['publish_date'] = content.get('publish_date')
-
-            # --- ОБРАБОТКА ИЗОБРАЖЕНИЯ ---
-            if content.get('image_url'):
-                logger.info("📸 Загружаю фото в VK...")
-                photo_attachment = self._upload_photo(
-                    content['image_url'], 
-                    access_token, 
-                    group_id
-                )
-                if photo_attachment:
-                    params['attachments'] = photo_attachment
-            # -----------------------------
-            
-            response = requests.post("https://api.vk.com/method/wall.post", params=params)
-            result = response.json()
-            
-            if 'error' in result:
-                logger.error(f"VK API Error: {result['error']}")
-                return {'success': False, 'error': result['error']}
+            params = self._build_wall_params(content, business_info)
+            params.update({'access_token': access_token, 'v': self.api_version})
             
-            post_id = result['response']['post_id']
-            logger.info(f"✅ Пост опубликован в VK, ID: {post_id}")
-            return {'success': True, 'post_id': post_id}
+            result = self._call_method('wall.post', params, http_method='post')
+            return self._wall_post_result(result)
             
+        except requests.RequestException as e:
+            logger.error(f"Сетевая ошибка публикации в VK: {e}")
+            return self._network_error_result(e, content)
         except Exception as e:
             logger.error(f"Ошибка публикации в VK: {e}")
-            return {'success': False, 'error': str(e)}
\ No newline at end of file
+            return {'success': False, 'error': str(e)}
+
+    def publish_many(self, items: List[Tuple[Dict, Dict]]) -> List[Dict]:
+        """
+        Пакетная публикация [(content, business_info), ...].
+        Посты одного токена уходят пачками по 25 wall.post в одном execute.
+        Результаты в том же порядке и формате, что и у publish().
+        """
+        results = [None] * len(items)
+        by_token = {}
+        for i, (content, business_info) in enumerate(items):
+            access_token = business_info.get('access_token')
+            if not access_token:
+                results[i] = {'success': False, 'error': 'No access token provided'}
+                continue
+            by_token.setdefault(access_token, []).append(i)
+
+        for access_token, indexes in by_token.items():
+            try:
+                calls = [('wall.post', self._build_wall_params(*items[i])) for i in indexes]
+                batch = self.execute_batch(access_token, calls)
+                for i, result in zip(indexes, batch):
+                    results[i] = self._wall_post_result(result)
+            except requests.RequestException as e:
+                logger.error(f"Сетевая ошибка пакетной публикации в VK: {e}")
+                for i in indexes:
+                    results[i] = self._network_error_result(e, items[i][0])
+            except Exception as e:
+                logger.error(f"Ошибка пакетной публикации в VK: {e}")
+                for i in indexes:
+                    results[i] = {'success': False, 'error': str(e)}
+        return results
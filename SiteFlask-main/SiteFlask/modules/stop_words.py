@@ -0,0 +1,98 @@
+import re
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Union
+
+# Окончания, которые срезаются перед поиском (сначала длинные): так "дешево"
+# и "дешёвый" сводятся к одной основе "дешев", а в тексте после основы допускается
+# только одно из этих окончаний ("шок" не совпадет с "шоколад")
+_ENDINGS = sorted([
+    'ыми', 'ими', 'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ешь', 'ишь', 'ете', 'ите',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ом', 'ем', 'ам', 'ям',
+    'ах', 'ях', 'ов', 'ев', 'ей', 'ую', 'юю', 'ть', 'ет', 'ит', 'ют', 'ут', 'ат', 'ят',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+], key=len, reverse=True)
+_MIN_STEM = 3
+_ENDING_PATTERN = '(?:' + '|'.join(_ENDINGS) + ')?'
+
+
+def fold(text: str) -> str:
+    """Нижний регистр и ё -> е (длина строки не меняется, позиции совпадают с исходным текстом)"""
+    return text.lower().replace('ё', 'е')
+
+
+def stem(word: str) -> str:
+    """Грубая основа слова: срезает одно окончание, если основа остается не короче _MIN_STEM"""
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def word_pattern(word: str) -> str:
+    """Выражение для форм слова: основа + необязательное окончание, а без окончания — только само слово"""
+    base = stem(word)
+    if base == word:
+        return re.escape(word)
+    return re.escape(base) + _ENDING_PATTERN
+
+
+def parse_stop_words(stop_words: Union[str, Iterable[str], None]) -> Tuple[str, ...]:
+    """Стоп-слова из BusinessProfile.stop_words ("a,b") или списка business_info"""
+    if not stop_words:
+        return ()
+    if isinstance(stop_words, str):
+        stop_words = stop_words.split(',')
+    return tuple(dict.fromkeys(w.strip() for w in stop_words if w and w.strip()))
+
+
+class StopWordMatcher:
+    """
+    Все стоп-слова профиля в одном скомпилированном регулярном выражении.
+    Слово ищется целиком по основе с одним из известных окончаний, поэтому совпадают
+    его формы ("скидка" -> "скидки", "скидку"), но не другие слова с тем же началом;
+    фразы из нескольких слов — с любыми пробелами.
+    """
+
+    def __init__(self, stop_words: Iterable[str]):
+        self.stop_words = list(stop_words)
+        alternatives = []
+        for index, word in enumerate(self.stop_words):
+            parts = [word_pattern(part) for part in fold(word).split()]
+            if parts:
+                phrase = r'\s+'.join(parts)
+                alternatives.append(f"(?P<w{index}>(?<!\\w){phrase}(?!\\w))")
+        self._pattern = re.compile('|'.join(alternatives)) if alternatives else None
+
+    def spans(self, text: str) -> List[Tuple[int, int, str]]:
+        """[(начало, конец, стоп-слово), ...] для всех вхождений"""
+        if self._pattern is None or not text:
+            return []
+        return [
+            (m.start(), m.end(), self.stop_words[int(m.lastgroup[1:])])
+            for m in self._pattern.finditer(fold(text))
+        ]
+
+    def find(self, text: str) -> List[str]:
+        """Найденные стоп-слова (без повторов, в порядке профиля)"""
+        found = {word for _, _, word in self.spans(text)}
+        return [word for word in self.stop_words if word in found]
+
+    def highlight(self, text: str) -> str:
+        """Текст, где найденные стоп-слова выделены капслоком"""
+        result = text
+        for start, end, _ in self.spans(text):
+            result = result[:start] + result[start:end].upper() + result[end:]
+        return result
+
+
+@lru_cache(maxsize=1024)
+def _matcher(stop_words: Tuple[str, ...]) -> StopWordMatcher:
+    return StopWordMatcher(stop_words)
+
+
+def stop_word_matcher(stop_words: Union[str, Iterable[str], None]) -> StopWordMatcher:
+    """
+    Матчер для набора стоп-слов. Кэшируется по самому набору: пока стоп-слова профиля
+    не меняются, выражение не перекомпилируется, а после правки собирается новое.
+    """
+    return _matcher(parse_stop_words(stop_words))
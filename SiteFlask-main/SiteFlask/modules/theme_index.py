@@ -0,0 +1,102 @@
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import HashingVectorizer
+
+from config.settings import moderator_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _UserThemes:
+    """Темы одного пользователя: id, тексты и матрица векторов (строки в порядке id)"""
+
+    def __init__(self, n_features: int):
+        self.ids: List[int] = []
+        self.texts: List[str] = []
+        self.vectors = sp.csr_matrix((0, n_features))
+        self.max_id = 0
+
+
+class ThemeIndex:
+    """
+    Индекс тем постов для поиска дублей без LLM.
+    Темы кодируются символьными n-граммами через HashingVectorizer: словарь не нужен,
+    поэтому новые темы добавляются без переобучения. Векторы нормированы, косинусная
+    близость — скалярное произведение. Индекс пользователя строится при первом
+    обращении и дочитывает из БД только темы с id больше уже известных.
+    """
+
+    def __init__(self, threshold: float = None):
+        self.threshold = threshold or moderator_config.SIMILARITY_THRESHOLD
+        self.vectorizer = HashingVectorizer(
+            analyzer='char_wb',
+            ngram_range=(3, 5),
+            n_features=2 ** 18,
+            alternate_sign=False,
+            lowercase=True,
+            norm='l2'
+        )
+        self._users: Dict[int, _UserThemes] = {}
+        self._lock = threading.Lock()
+
+    def _vectorize(self, texts: List[str]) -> sp.csr_matrix:
+        return self.vectorizer.transform([' '.join(text.split()) for text in texts])
+
+    def _append(self, user: _UserThemes, themes: Iterable[Tuple[int, str]]):
+        new = sorted((theme_id, text) for theme_id, text in themes if theme_id > user.max_id and text)
+        if not new:
+            return
+        user.ids.extend(theme_id for theme_id, _ in new)
+        user.texts.extend(text for _, text in new)
+        user.vectors = sp.vstack([user.vectors, self._vectorize([text for _, text in new])], format='csr')
+        user.max_id = user.ids[-1]
+
+    def add(self, user_id, themes: Iterable[Tuple[int, str]]):
+        """
+        Добавляет только что сохраненные темы [(id, текст), ...].
+        Если индекс пользователя еще не построен, темы подтянутся при первом sync.
+        """
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is not None:
+                self._append(user, themes)
+
+    def sync(self, user_id):
+        """Дочитывает из БД темы пользователя, появившиеся после последней синхронизации"""
+        from models import db, PostTheme
+
+        with self._lock:
+            user = self._users.get(user_id)
+            if user is None:
+                user = self._users[user_id] = _UserThemes(self.vectorizer.n_features)
+            rows = db.session.query(PostTheme.id, PostTheme.theme_text).filter(
+                PostTheme.user_id == user_id,
+                PostTheme.id > user.max_id
+            ).all()
+            self._append(user, rows)
+
+    def most_similar(self, user_id, text: str, skip_latest: int = 0) -> Optional[Tuple[str, float]]:
+        """Самая похожая тема пользователя (без skip_latest самых новых) и ее близость"""
+        self.sync(user_id)
+        with self._lock:
+            user = self._users[user_id]
+            count = len(user.ids) - skip_latest
+            if count <= 0:
+                return None
+            scores = (user.vectors[:count] @ self._vectorize([text]).T).toarray().ravel()
+            best = int(np.argmax(scores))
+            return user.texts[best], float(scores[best])
+
+    def find_duplicate(self, user_id, text: str, skip_latest: int = 0) -> Optional[Tuple[str, float]]:
+        """Тема-дубль, если близость не ниже порога, иначе None"""
+        match = self.most_similar(user_id, text, skip_latest)
+        if match and match[1] >= self.threshold:
+            return match
+        return None
+
+
+theme_index = ThemeIndex()
@@ -0,0 +1,123 @@
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import vk_config
+from modules.vk_transport import vk_transport
+from utils.logger import get_logger
+from utils.ttl_cache import TTLCache
+
+logger = get_logger(__name__)
+
+# Коды VK, означающие, что токен больше не действует:
+# 5 — авторизация пользователя, 27 — авторизация группы, 28 — авторизация приложения
+INVALID_TOKEN_ERRORS = {5, 27, 28}
+
+
+def _error_code(result: Dict) -> Optional[int]:
+    error = result.get('error')
+    return error.get('error_code') if isinstance(error, dict) else None
+
+
+class VKAccountCache:
+    """
+    Общий на процесс кэш метаданных групп (название, подписчики) и валидности токенов.
+    Записи живут TTL и вытесняются по LRU. Неизвестный токен считается живым —
+    мертвым его делает только явный ответ VK с ошибкой авторизации.
+    """
+
+    def __init__(self, maxsize: int = None, group_ttl: int = None, token_ttl: int = None):
+        maxsize = maxsize or vk_config.ACCOUNT_CACHE_SIZE
+        self._groups = TTLCache(maxsize=maxsize, ttl=group_ttl or vk_config.GROUP_CACHE_TTL)
+        self._tokens = TTLCache(maxsize=maxsize, ttl=token_ttl or vk_config.TOKEN_CACHE_TTL)
+        self._refresher = None
+
+    # --- Токены ---
+
+    def is_token_alive(self, access_token: Optional[str]) -> bool:
+        if not access_token:
+            return False
+        return self._tokens.get(access_token, True)
+
+    def note_result(self, access_token: Optional[str], result: Dict):
+        """Учитывает ответ VK (publish или вызов API): ошибка авторизации помечает токен мертвым"""
+        if not access_token:
+            return
+        if _error_code(result) in INVALID_TOKEN_ERRORS:
+            if self._tokens.get(access_token, True):
+                logger.warning(f"🔒 Токен ...{access_token[-6:]} недействителен, аккаунт будет пропускаться")
+            self._tokens.set(access_token, False)
+        elif result.get('success') or 'response' in result:
+            self._tokens.set(access_token, True)
+
+    # --- Группы ---
+
+    def get_group(self, group_id, access_token: str) -> Optional[Dict]:
+        """Метаданные группы из кэша или одним вызовом groups.getById"""
+        group = self._groups.get(str(group_id))
+        if group is not None:
+            return group
+
+        data = vk_transport.call('groups.getById', {
+            'group_id': group_id,
+            'fields': 'members_count',
+            'access_token': access_token,
+            'v': vk_config.API_VERSION
+        })
+        self.note_result(access_token, data)
+
+        response = data.get('response')
+        if isinstance(response, dict):
+            # Начиная с 5.139 ответ обернут в {'groups': [...]}
+            response = response.get('groups', [])
+        if not response:
+            return None
+
+        self._groups.set(str(group_id), response[0])
+        return response[0]
+
+    def refresh_many(self, accounts: Iterable[Tuple[str, str]]):
+        """Массовое обновление [(group_id, access_token), ...] пачками через execute"""
+        from modules.social_api import VKontakteAPI
+
+        accounts = list(accounts)
+        if not accounts:
+            return
+
+        results = VKontakteAPI().fetch_groups_info_many(accounts, fields='members_count')
+        # Сначала ошибки, потом успехи: токен, который сработал хоть для одной группы, жив
+        for (group_id, access_token), result in zip(accounts, results):
+            if not result.get('response'):
+                self.note_result(access_token, result)
+        for (group_id, access_token), result in zip(accounts, results):
+            if result.get('response'):
+                self.note_result(access_token, result)
+                self._groups.set(str(group_id), result['response'])
+
+        dead = sum(1 for _, access_token in accounts if not self.is_token_alive(access_token))
+        logger.info(f"🗂️ Кэш VK-аккаунтов обновлен: {len(accounts)} шт., с мертвым токеном: {dead}")
+
+    def start_refresher(self, load_accounts: Callable[[], List[Tuple[str, str]]], interval: int = None):
+        """Фоновый поток: каждые interval сек. обновляет кэш для аккаунтов из load_accounts()"""
+        if self._refresher is not None:
+            return
+        interval = interval or vk_config.ACCOUNT_REFRESH_INTERVAL
+        stop = threading.Event()
+
+        def loop():
+            while not stop.is_set():
+                try:
+                    self.refresh_many(load_accounts())
+                except Exception as e:
+                    logger.error(f"Ошибка обновления кэша VK-аккаунтов: {e}")
+                stop.wait(interval)
+
+        self._refresher = stop
+        threading.Thread(target=loop, name="vk-account-cache", daemon=True).start()
+
+    def stop_refresher(self):
+        if self._refresher is not None:
+            self._refresher.set()
+            self._refresher = None
+
+
+vk_account_cache = VKAccountCache()
@@ -0,0 +1,318 @@
+import asyncio
+import time
+import weakref
+from typing import Dict, List, Optional, Tuple
+
+import aiohttp
+from flask import current_app, has_app_context
+
+from config.settings import vk_config
+from modules.photo_cache import photo_store
+from modules.rate_limiter import vk_rate_limiter
+from modules.social_api import EXECUTE_BATCH_SIZE, STREAM_CHUNK_SIZE, VKontakteAPI, _upload_servers
+from modules.vk_transport import VK_API_URL
+from utils.logger import get_logger
+from utils.metrics import VK_REQUEST_DURATION
+
+logger = get_logger(__name__)
+
+
+class AsyncVKTransport:
+    """
+    Асинхронный транспорт VK на aiohttp: один ClientSession с пулом соединений,
+    таймауты connect/read и тот же лимит запросов на токен, что у VKTransport.
+    Сессия создается лениво в текущем цикле событий и пересоздается, если цикл сменился.
+    """
+
+    def __init__(self, connections: int = None):
+        self.connections = connections or vk_config.ASYNC_CONNECTIONS
+        self.timeout = aiohttp.ClientTimeout(sock_connect=vk_config.CONNECT_TIMEOUT, sock_read=vk_config.READ_TIMEOUT)
+        self.download_timeout = aiohttp.ClientTimeout(
+            sock_connect=vk_config.CONNECT_TIMEOUT, sock_read=vk_config.DOWNLOAD_TIMEOUT
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._loop = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._loop is not loop:
+            connector = aiohttp.TCPConnector(limit=self.connections, limit_per_host=self.connections)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=self.timeout,
+                headers={'Accept-Encoding': 'gzip, deflate'}
+            )
+            self._loop = loop
+        return self._session
+
+    async def call(self, method: str, params: Dict, http_method: str = 'get') -> Dict:
+        """Вызов метода VK API. Возвращает распарсенный JSON (с 'response' или 'error')"""
+        await vk_rate_limiter.acquire_async(params.get('access_token'))
+        url = f"{VK_API_URL}/{method}"
+        started = time.perf_counter()
+        try:
+            if http_method == 'post':
+                request = self.session.post(url, data=params)
+            else:
+                request = self.session.get(url, params=params)
+            async with request as response:
+                return await response.json(content_type=None)
+        finally:
+            VK_REQUEST_DURATION.observe(time.perf_counter() - started, method=method)
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+
+async def _run_in_app_thread(func, *args):
+    """
+    Блокирующий вызов (SQLAlchemy) в отдельном потоке, чтобы не стопорить цикл событий.
+    В потоке поднимается свой контекст того же приложения (и своя сессия БД).
+    Без контекста приложения у вызывающего кода функция работает без него,
+    и кэш фото просто пропускается.
+    """
+    app = current_app._get_current_object() if has_app_context() else None
+
+    def call():
+        if app is None:
+            return func(*args)
+        with app.app_context():
+            return func(*args)
+
+    return await asyncio.to_thread(call)
+
+
+class AsyncVKontakteAPI(VKontakteAPI):
+    """
+    Асинхронный клиент VK: публикация, загрузка фото и статистика.
+    Подготовка параметров и разбор ответов общие с VKontakteAPI, сеть — через aiohttp,
+    поэтому один цикл событий держит сотни одновременных публикаций без потока на каждую.
+    """
+
+    def __init__(self, transport: AsyncVKTransport = None):
+        super().__init__()
+        self.transport = transport or AsyncVKTransport()
+        self._upload_slots = weakref.WeakKeyDictionary()
+
+    async def _call_method_async(self, method: str, params: Dict, http_method: str = 'get') -> Dict:
+        return await self.transport.call(method, params, http_method=http_method)
+
+    async def _get_upload_server_async(self, access_token, group_id):
+        cached = _upload_servers.get((access_token, group_id))
+        if cached:
+            return cached
+
+        server_resp = await self._call_method_async('photos.getWallUploadServer', {
+            'access_token': access_token,
+            'group_id': group_id,
+            'v': self.api_version
+        })
+
+        if 'error' in server_resp:
+            logger.error(f"VK Upload Server Error: {server_resp['error']}")
+            return None
+
+        upload_url = server_resp['response']['upload_url']
+        _upload_servers.set((access_token, group_id), upload_url)
+        return upload_url
+
+    async def _stream_to_upload_server_async(self, image_url, upload_url) -> Dict:
+        """Скачивание картинки сразу в multipart-запрос к VK, без буфера на весь файл"""
+        session = self.transport.session
+
+        async with session.get(image_url, timeout=self.transport.download_timeout) as source:
+            source.raise_for_status()
+
+            async def chunks():
+                async for chunk in source.content.iter_chunked(STREAM_CHUNK_SIZE):
+                    yield chunk
+
+            with aiohttp.MultipartWriter('form-data') as body:
+                part = body.append(chunks(), {'Content-Type': 'image/jpeg'})
+                part.set_content_disposition('form-data', name='photo', filename='image.jpg')
+
+                started = time.perf_counter()
+                try:
+                    async with session.post(upload_url, data=body, timeout=self.transport.download_timeout) as resp:
+                        upload_resp = await resp.json(content_type=None)
+                finally:
+                    VK_REQUEST_DURATION.observe(time.perf_counter() - started, method='photo.upload')
+
+        return upload_resp
+
+    async def _upload_photo_async(self, image_url, access_token, group_id, upload_url=None) -> Optional[str]:
+        """Загрузка одного фото без кэша. Возвращает вложение или None"""
+        # Семафор привязан к циклу событий, поэтому свой на каждый цикл
+        loop = asyncio.get_running_loop()
+        upload_slots = self._upload_slots.get(loop)
+        if upload_slots is None:
+            upload_slots = self._upload_slots[loop] = asyncio.Semaphore(vk_config.PHOTO_UPLOAD_WORKERS)
+
+        try:
+            upload_url = upload_url or await self._get_upload_server_async(access_token, group_id)
+            if not upload_url:
+                return None
+
+            async with upload_slots:
+                upload_resp = await self._stream_to_upload_server_async(image_url, upload_url)
+
+            save_resp = await self._call_method_async('photos.saveWallPhoto', {
+                'access_token': access_token,
+                'group_id': group_id,
+                'photo': upload_resp['photo'],
+                'server': upload_resp['server'],
+                'hash': upload_resp['hash'],
+                'v': self.api_version
+            }, http_method='post')
+
+            if 'error' in save_resp:
+                logger.error(f"VK Save Photo Error: {save_resp['error']}")
+                _upload_servers.pop((access_token, group_id))
+                return None
+
+            photo_obj = save_resp['response'][0]
+            return f"photo{photo_obj['owner_id']}_{photo_obj['id']}"
+
+        except Exception as e:
+            logger.error(f"Critical upload error: {e}")
+            return None
+
+    async def _upload_photos_async(self, image_urls: List[str], access_token, group_id) -> List[str]:
+        """Параллельная загрузка фото поста с кэшем вложений. Порядок сохраняется"""
+        cached = await _run_in_app_thread(photo_store.lookup, image_urls, group_id)
+        missing = [url for url in image_urls if url not in cached]
+
+        uploaded = []
+        if missing:
+            upload_url = await self._get_upload_server_async(access_token, group_id)
+            if upload_url:
+                uploaded = await asyncio.gather(*(
+                    self._upload_photo_async(image_url, access_token, group_id, upload_url) for image_url in missing
+                ))
+
+        new_entries = []
+        for image_url, attachment in zip(missing, uploaded):
+            if attachment:
+                cached[image_url] = attachment
+                new_entries.append((image_url, attachment))
+        await _run_in_app_thread(photo_store.store, new_entries, group_id)
+
+        return [cached[url] for url in image_urls if url in cached]
+
+    async def _build_wall_params_async(self, content: Dict, business_info: Dict) -> Dict:
+        params, image_urls = self._prepare_wall_params(content, business_info)
+        if image_urls:
+            logger.info(f"📸 Загружаю фото в VK ({len(image_urls)} шт.)...")
+            attachments = await self._upload_photos_async(
+                image_urls,
+                business_info.get('access_token'),
+                business_info.get('vk_group_id')
+            )
+            if attachments:
+                params['attachments'] = ','.join(attachments)
+        return params
+
+    async def execute_batch_async(self, access_token: str, calls: List[Tuple[str, Dict]]) -> List[Dict]:
+        """Асинхронный execute_batch: пачки по 25 уходят параллельно (лимит токена соблюдает транспорт)"""
+        chunks = [calls[start:start + EXECUTE_BATCH_SIZE] for start in range(0, len(calls), EXECUTE_BATCH_SIZE)]
+        responses = await asyncio.gather(*(
+            self._call_method_async('execute', {
+                'access_token': access_token,
+                'v': self.api_version,
+                'code': self._execute_code(chunk)
+            }, http_method='post')
+            for chunk in chunks
+        ))
+
+        results = []
+        for resp, chunk in zip(responses, chunks):
+            results.extend(self._parse_execute(resp, chunk))
+        return results
+
+    async def _execute_grouped_async(self, accounts: List[Tuple[str, str]], make_call) -> List[Dict]:
+        results = [None] * len(accounts)
+        by_token = {}
+        for i, (group_id, access_token) in enumerate(accounts):
+            by_token.setdefault(access_token, []).append(i)
+
+        async def run(access_token, indexes):
+            try:
+                batch = await self.execute_batch_async(access_token, [make_call(accounts[i][0]) for i in indexes])
+            except Exception as e:
+                logger.error(f"Ошибка пакетного запроса к VK: {e}")
+                batch = [{'error': {'error_code': 1, 'error_msg': str(e)}}] * len(indexes)
+            for i, result in zip(indexes, batch):
+                results[i] = result
+
+        await asyncio.gather(*(run(token, indexes) for token, indexes in by_token.items()))
+        return results
+
+    async def fetch_stats_many_async(self, accounts: List[Tuple[str, str]], **stats_params) -> List[Dict]:
+        """stats.get для многих групп [(group_id, access_token), ...]"""
+        return await self._execute_grouped_async(
+            accounts,
+            lambda group_id: ('stats.get', {'group_id': group_id, **stats_params})
+        )
+
+    async def fetch_groups_info_many_async(self, accounts: List[Tuple[str, str]], fields: str = 'members_count') -> List[Dict]:
+        """groups.getById для многих групп"""
+        return self._unwrap_groups(await self._execute_grouped_async(
+            accounts,
+            lambda group_id: ('groups.getById', {'group_id': group_id, 'fields': fields})
+        ))
+
+    async def publish_async(self, content: Dict, business_info: Dict) -> Dict:
+        """Публикация в VK без блокировки цикла событий. Формат результата как у publish()"""
+        try:
+            access_token = business_info.get('access_token')
+
+            if not access_token:
+                return {'success': False, 'error': 'No access token provided'}
+
+            params = await self._build_wall_params_async(content, business_info)
+            params.update({'access_token': access_token, 'v': self.api_version})
+
+            result = await self._call_method_async('wall.post', params, http_method='post')
+            return self._wall_post_result(result)
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"Сетевая ошибка публикации в VK: {e}")
+            return self._network_error_result(e, content)
+        except Exception as e:
+            logger.error(f"Ошибка публикации в VK: {e}")
+            return {'success': False, 'error': str(e)}
+
+    async def publish_many_async(self, items: List[Tuple[Dict, Dict]]) -> List[Dict]:
+        """Пакетная публикация через execute, токены обрабатываются параллельно"""
+        results = [None] * len(items)
+        by_token = {}
+        for i, (content, business_info) in enumerate(items):
+            access_token = business_info.get('access_token')
+            if not access_token:
+                results[i] = {'success': False, 'error': 'No access token provided'}
+                continue
+            by_token.setdefault(access_token, []).append(i)
+
+        async def run(access_token, indexes):
+            try:
+                params = await asyncio.gather(*(self._build_wall_params_async(*items[i]) for i in indexes))
+                batch = await self.execute_batch_async(access_token, [('wall.post', p) for p in params])
+                for i, result in zip(indexes, batch):
+                    results[i] = self._wall_post_result(result)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logger.error(f"Сетевая ошибка пакетной публикации в VK: {e}")
+                for i in indexes:
+                    results[i] = self._network_error_result(e, items[i][0])
+            except Exception as e:
+                logger.error(f"Ошибка пакетной публикации в VK: {e}")
+                for i in indexes:
+                    results[i] = {'success': False, 'error': str(e)}
+
+        await asyncio.gather(*(run(token, indexes) for token, indexes in by_token.items()))
+        return results
+
+    async def close(self):
+        await self.transport.close()
@@ -0,0 +1,58 @@
+from typing import Dict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config.settings import vk_config
+from modules.rate_limiter import vk_rate_limiter
+from utils.metrics import VK_REQUEST_DURATION
+
+VK_API_URL = vk_config.API_BASE_URL.rstrip('/')
+
+
+class VKTransport:
+    """
+    Общий HTTP-транспорт для всех обращений к VK.
+    Один requests.Session с пулом keep-alive соединений (без TLS-рукопожатия на каждый
+    вызов), обязательные таймауты connect/read, gzip и лимит запросов на токен.
+    """
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+        pool_size = pool_size or vk_config.POOL_SIZE
+        self.timeout = (
+            connect_timeout or vk_config.CONNECT_TIMEOUT,
+            read_timeout or vk_config.READ_TIMEOUT
+        )
+        self.download_timeout = (self.timeout[0], vk_config.DOWNLOAD_TIMEOUT)
+
+        self.session = requests.Session()
+        # Ретраи делает PublishRetryPolicy, поэтому адаптер сам не повторяет запросы
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+
+    def call(self, method: str, params: Dict, http_method: str = 'get') -> Dict:
+        """Вызов метода VK API. Возвращает распарсенный JSON (с 'response' или 'error')"""
+        vk_rate_limiter.acquire(params.get('access_token'))
+        url = f"{VK_API_URL}/{method}"
+        with VK_REQUEST_DURATION.time(method=method):
+            if http_method == 'post':
+                response = self.session.post(url, data=params, timeout=self.timeout)
+            else:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+        return response.json()
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GET на произвольный адрес (скачивание картинок) через общий пул"""
+        kwargs.setdefault('timeout', self.download_timeout)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        """POST на произвольный адрес (upload-сервер VK) через общий пул"""
+        kwargs.setdefault('timeout', self.download_timeout)
+        return self.session.post(url, **kwargs)
+
+
+# Глобальный транспорт на процесс (requests.Session потокобезопасен для таких запросов)
+vk_transport = VKTransport()
@@ -1,7 +1,9 @@
 from flask import render_template, request, jsonify, redirect, session, Blueprint
 from datetime import datetime
 from models import VKStatistic, VKAccount, Post, db
-import requests
+from modules.vk_transport import vk_transport
+from services.vk_sync import save_group_stats
+from modules.vk_account_cache import vk_account_cache
 
 vk_add = Blueprint('vk_add', __name__)
 
@@ -105,21 +107,12 @@ def add_vk_account():
     return render_template('addvkaccount.html')
 
 def get_group_name_from_vk(group_id, access_token):
-    """Получаем название группы из VK API"""
+    """Получаем название группы из VK API (через общий кэш метаданных групп)"""
     try:
-        # Запрос к VK API для получения информации о группе
-        url = f'https://api.vk.com/method/groups.getById'
-        params = {
-            'group_id': group_id,
-            'access_token': access_token,
-            'v': '5.131'
-        }
-        
-        response = requests.get(url, params=params)
-        data = response.json()
+        group = vk_account_cache.get_group(group_id, access_token)
         
-        if 'response' in data and len(data['response']) > 0:
-            return data['response'][0]['name']
+        if group:
+            return group['name']
         else:
             return f'Группа {group_id}'
             
@@ -141,13 +134,14 @@ def fetch_vk_stats(account_id):
         if account.user_id != user_id:
             return jsonify({'success': False, 'error': 'Нет доступа'})
         
-        # Получаем статистику
-        success = fetch_vk_statistics(account_id)
+        # Статистику обновляет фоновый run_collector.py — отдаем время последнего сбора
+        stat = VKStatistic.query.filter_by(vk_account_id=account_id)\
+            .order_by(VKStatistic.updated_at.desc()).first()
         
-        if success:
-            return jsonify({'success': True})
-        else:
-            return jsonify({'success': False, 'error': 'Не удалось получить статистику'})
+        return jsonify({
+            'success': True,
+            'updated_at': stat.updated_at.isoformat() if stat and stat.updated_at else None
+        })
             
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
@@ -157,23 +151,14 @@ def fetch_vk_statistics(account_id):
     try:
         account = VKAccount.query.get(account_id)
         
-        # Получаем статистику группы
+        # Получаем статистику группы (первичный сбор при подключении; дальше — run_collector.py)
         stats = get_vk_group_stats(account.group_id, account.access_token)
+        if not stats:
+            return False
         
         # Сохраняем статистику в базу
-        vk_stat = VKStatistic(
-            vk_account_id=account_id,
-            date=datetime.utcnow().date(),
-            followers_count=stats.get('members_count', 0),
-            reach=stats.get('reach', 0),
-            likes=stats.get('likes', 0),
-            comments=stats.get('comments', 0),
-            shares=stats.get('reposts', 0),
-            views=stats.get('views', 0),
-            engagement=stats.get('likes', 0) + stats.get('comments', 0) + stats.get('reposts', 0)
-        )
+        save_group_stats(account, stats[0])
         
-        db.session.add(vk_stat)
         db.session.commit()
         
         return True
@@ -186,7 +171,6 @@ def get_vk_group_stats(group_id, access_token):
     """Получение статистики группы из VK API"""
     try:
         # Получаем базовую статистику
-        url = 'https://api.vk.com/method/stats.get'
         params = {
             'group_id': group_id,
             'timestamp_from': int((datetime.now().timestamp() - 86400)),  # последние 24 часа
@@ -195,8 +179,7 @@ def get_vk_group_stats(group_id, access_token):
             'v': '5.131'
         }
         
-        response = requests.get(url, params=params)
-        data = response.json()
+        data = vk_transport.call('stats.get', params)
         
         if 'response' in data:
             return data['response']
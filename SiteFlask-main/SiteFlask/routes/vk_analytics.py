@@ -1,10 +1,10 @@
 from flask import Blueprint, request, jsonify, session, render_template, redirect
-from models import VKAccount, BusinessProfile, VKStatistic, db, Post
+from models import VKAccount, BusinessProfile, VKStatistic, VKSyncState, db, Post
 from services.ai_service import ai_service
+from services.generation_pipeline import GenerationPipeline
 from datetime import datetime
 from models import Post
 from modules.social_api import VKontakteAPI
-import requests
 
 vk_bp = Blueprint('vk', __name__)
 platforms_cache = {} # Кэш платформ пользователей
@@ -41,16 +41,9 @@ def api_vk_auto_generate():
         # Генерируем идеи
         themes = ai_service.generate_theme_ideas(user_id, profile.BusinessPrompt)
         
-        raw_content_list = []
-        for theme in themes:
-            text = ai_service.generate_post_content(theme)
-            # Если генерация упала, пропускаем или берем дефолт
-            if text:
-                raw_content_list.append({
-                    'title': theme,
-                    'text': text,
-                    'image_url': None # Или вызовите генератор картинок
-                })
+        # Тексты по всем темам генерируются параллельно (упавшие пропускаются),
+        # модерацию делает process_generated_content
+        raw_content_list = GenerationPipeline(generate_images=False).run(themes)
 
         # ИСПРАВЛЕННЫЙ ИМПОРТ:
     
@@ -134,71 +127,21 @@ def fetch_vk_data(account_id):
         return jsonify({'success': False, 'error': 'Аккаунт не найден'})
 
     try:
-        # --- ЧАСТЬ 1: Обновляем метрики постов (wall.get) ---
-        wall_url = "https://api.vk.com/method/wall.get"
-        wall_params = {
-            'access_token': account.access_token,
-            'v': '5.199',
-            'owner_id': f"-{account.group_id}", # Минус для группы обязателен
-            'count': 50, # Берем последние 50 постов
-            'extended': 0
-        }
-        
-        wall_res = requests.get(wall_url, params=wall_params).json()
-        
-        updated_count = 0
-        if 'response' in wall_res:
-            for item in wall_res['response']['items']:
-                # Формируем ID в том формате, как он записан у вас в AI Scheduler
-                # Формат: -GROUPID_POSTID (например: -12345678_154)
-                full_vk_id = f"{item['owner_id']}_{item['id']}"
-                
-                # Ищем пост в нашей базе
-                post = Post.query.filter_by(vk_post_id=full_vk_id).first()
-                
-                if post:
-                    # Обновляем цифры
-                    post.likes = item.get('likes', {}).get('count', 0)
-                    post.views = item.get('views', {}).get('count', 0)
-                    post.shares = item.get('reposts', {}).get('count', 0)
-                    post.comments = item.get('comments', {}).get('count', 0)
-                    updated_count += 1
-        
-        # --- ЧАСТЬ 2: Обновляем общую статистику группы (stats.get) ---
-        stats_url = "https://api.vk.com/method/stats.get"
-        stats_params = {
-            'access_token': account.access_token,
-            'v': '5.199',
-            'group_id': account.group_id,
-            'interval': 'day',
-            'intervals_count': 1
-        }
-        
-        stats_res = requests.get(stats_url, params=stats_params).json()
-        
-        if 'response' in stats_res and stats_res['response']:
-            data = stats_res['response'][0]
-            
-            stat_record = VKStatistic.query.filter_by(vk_account_id=account.id).first()
-            if not stat_record:
-                stat_record = VKStatistic(vk_account_id=account.id)
-                db.session.add(stat_record)
-            
-            # Обновляем поля статистики
-            stat_record.reach = data.get('reach', {}).get('reach', 0)
-            stat_record.engagement = data.get('visitors', {}).get('views', 0)
-            stat_record.updated_at = datetime.now() # Или created_at, как у вас в модели
-            
-            # Демография (если нужно)
-            if 'sex' in data.get('reach', {}):
-                sex_data = data['reach']['sex']
-                # Простая логика: ищем процент женщин (f) и мужчин (m)
-                # ... тут можно добавить парсинг пола ...
+        # Данные собирает фоновый run_collector.py — здесь только читаем готовое
+        stat_record = VKStatistic.query.filter_by(vk_account_id=account.id)\
+            .order_by(VKStatistic.updated_at.desc()).first()
+        sync_state = VKSyncState.query.get(account.id)
 
-        db.session.commit()
+        updated_at = stat_record.updated_at if stat_record else None
+        if sync_state and sync_state.last_synced_at and (not updated_at or sync_state.last_synced_at > updated_at):
+            updated_at = sync_state.last_synced_at
+
+        if not updated_at:
+            return jsonify({'success': True, 'message': 'Статистика еще не собрана, она появится после ближайшего обхода.'})
         return jsonify({
             'success': True, 
-            'message': f'Обновлено постов: {updated_count}, статистика загружена.'
+            'updated_at': updated_at.isoformat(),
+            'message': f'Данные на {updated_at.strftime("%d.%m.%Y %H:%M")}'
         })
 
     except Exception as e:
@@ -0,0 +1,97 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import app, db
+from models import VKAccount
+from modules.social_api import VKontakteAPI
+from modules.vk_account_cache import vk_account_cache
+from services.vk_sync import wall_sync, save_group_stats
+from config.settings import collector_config
+from utils.logger import get_logger
+from utils.metrics import start_metrics_server
+
+logger = get_logger("AnalyticsCollector")
+
+
+class AnalyticsCollector:
+    """
+    Фоновый сборщик аналитики: по расписанию обновляет VKStatistic и метрики постов
+    для всех активных VK-аккаунтов. Веб-эндпоинты только читают готовые данные,
+    поэтому время ответа дашборда не зависит от VK.
+    """
+
+    def __init__(self):
+        self.vk = VKontakteAPI()
+        # Ограничивает число одновременно синхронизируемых стен;
+        # запросы одного токена дополнительно сдерживает vk_rate_limiter
+        self.executor = ThreadPoolExecutor(
+            max_workers=collector_config.WORKERS,
+            thread_name_prefix="collector"
+        )
+
+    def collect_all(self):
+        """Один обход всех активных аккаунтов"""
+        started = time.monotonic()
+
+        with app.app_context():
+            accounts = VKAccount.query.filter_by(is_active=True).all()
+            if not accounts:
+                return
+            account_ids = [account.id for account in accounts]
+
+            # Статистика групп и число подписчиков — пачками через execute
+            pairs = [(account.group_id, account.access_token) for account in accounts]
+            stats = self.vk.fetch_stats_many(pairs, interval='day', intervals_count=1)
+            groups = self.vk.fetch_groups_info_many(pairs, fields='members_count')
+
+            for account, stats_res, group_res in zip(accounts, stats, groups):
+                vk_account_cache.note_result(account.access_token, group_res)
+                if not stats_res.get('response'):
+                    logger.warning(f"⚠️ Нет статистики группы {account.group_id}: {stats_res.get('error')}")
+                    continue
+                group = group_res.get('response') or {}
+                save_group_stats(account, stats_res['response'][0], group.get('members_count'))
+            db.session.commit()
+
+        # Метрики постов — по аккаунту на поток
+        updated = sum(self.executor.map(self._sync_wall, account_ids))
+        logger.info(
+            f"📊 Аналитика обновлена: аккаунтов {len(account_ids)}, постов {updated}, "
+            f"за {time.monotonic() - started:.1f} сек."
+        )
+
+    def _sync_wall(self, account_id) -> int:
+        with app.app_context():
+            try:
+                account = VKAccount.query.get(account_id)
+                updated = wall_sync.sync_account(account)
+                db.session.commit()
+                return updated
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Ошибка синхронизации стены аккаунта {account_id}: {e}")
+                return 0
+
+    def run_forever(self):
+        logger.info(f"🏁 Сборщик аналитики запущен (каждые {collector_config.INTERVAL} сек.)")
+
+        if collector_config.METRICS_PORT:
+            start_metrics_server(collector_config.METRICS_PORT, host=collector_config.METRICS_HOST)
+
+        while True:
+            try:
+                next_run = time.monotonic() + collector_config.INTERVAL
+                self.collect_all()
+                time.sleep(max(0.0, next_run - time.monotonic()))
+            except KeyboardInterrupt:
+                logger.info("Останавливаю сборщик...")
+                self.executor.shutdown(wait=True)
+                break
+            except Exception as e:
+                logger.error(f"Глобальная ошибка сборщика: {e}")
+                time.sleep(10)
+
+
+if __name__ == "__main__":
+    collector = AnalyticsCollector()
+    collector.run_forever()
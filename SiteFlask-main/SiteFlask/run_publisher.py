@@ -1,12 +1,21 @@
 import time
-import pytz
-from datetime import datetime, timedelta
-from apscheduler.triggers.date import DateTrigger
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
 # --- ИМПОРТЫ ---
 from app import app, db 
 from models import Post as DBScheduledPost, VKAccount, BusinessProfile # Добавили VKAccount
 from services.platform import ContentPlatform # Импорт платформы
+from modules.post_dispatcher import post_dispatcher, local_now
+from modules.post_leases import PostLeaseManager
+from modules.replenish_pool import ReplenishmentPool
+from modules.shared_scheduler import run_jobs_in_this_process
+from modules.publish_retry import PublishRetryPolicy
+from modules.social_api import EXECUTE_BATCH_SIZE
+from modules.vk_account_cache import vk_account_cache
+from config.settings import daemon_config
 from utils.logger import get_logger
+from utils.metrics import PUBLISH_LAG, PUBLISHED_POSTS, QUEUE_DEPTH, start_metrics_server
 
 
 
@@ -14,191 +23,326 @@ logger = get_logger("AutoPublisherDaemon")
 
 class PublisherDaemon:
     def __init__(self):
-        # Планировщик инициализируем позже, внутри цикла обработки аккаунтов,
-        # или используем глобальный, если он один на всех.
-        # Для простоты создадим временный экземпляр платформы для доступа к шедулеру
-        # Но лучше хранить шедулеры отдельно.
-        # В данном решении мы будем создавать Platform на лету.
-        pass
+        # Platform для генерации создаем на лету, внутри цикла обработки аккаунтов.
+        # Публикация идет в ограниченном пуле потоков; лимит VK на токен
+        # соблюдает общий vk_rate_limiter внутри VKontakteAPI.
+        self.publish_executor = ThreadPoolExecutor(
+            max_workers=daemon_config.PUBLISH_WORKERS,
+            thread_name_prefix="publisher"
+        )
+        # ID постов, уже отданных в пул (чтобы сверка с БД не поставила их второй раз)
+        self._in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        # Аренда постов: несколько реплик демона могут работать параллельно без дублей
+        self.leases = PostLeaseManager()
+        # Повторы временных ошибок VK с backoff и dead-letter статусом
+        self.retry_policy = PublishRetryPolicy()
+        # Генерация контента (десятки LLM-запросов) идет в отдельном пуле,
+        # чтобы публикация по другим аккаунтам не ждала ее
+        self.replenish_pool = ReplenishmentPool(
+            workers=daemon_config.GENERATION_WORKERS,
+            queue_size=daemon_config.GENERATION_QUEUE_SIZE
+        )
 
     def check_and_refill_queues(self):
         """
-        Проверяет все активные аккаунты. Если постов мало -> генерирует новые.
+        Проверяет все активные аккаунты. Если постов мало -> ставит генерацию в фоновый пул.
         """
         logger.info("🔍 Проверка очередей постов для всех аккаунтов...")
         
         with app.app_context():
-            # Получаем все активные VK аккаунты
-            active_accounts = VKAccount.query.filter_by(is_active=True).all()
-            
-            for account in active_accounts:
-                # Считаем, сколько постов запланировано в будущем
-                pending_count = DBScheduledPost.query.filter_by(
-                    vk_account_id=account.id, 
-                    status='scheduled'
-                ).count()
-                
-                for account in active_accounts:
-                    # ИЗМЕНЕНИЕ: Считаем и запланированные, и черновики
-                    pending_count = DBScheduledPost.query.filter(
-                        DBScheduledPost.vk_account_id == account.id,
-                        DBScheduledPost.status.in_(['scheduled', 'draft']) # Учитываем оба статуса
-                    ).count()
-                    
-                    logger.info(f"Аккаунт {account.group_name}: в очереди {pending_count} постов (включая черновики).")
-                # ЕСЛИ ПОСТОВ МАЛО (например, меньше 2) -> ГЕНЕРИРУЕМ ЕЩЕ 5
-                if pending_count == 0:
-                    logger.info(f"⚡ Очередь пуста! Запускаю автогенерацию для {account.group_name}...")
-                    
-                    # Собираем business_info для платформы
-                    profile = BusinessProfile.query.filter_by(user_id=account.user_id).first()
-                    if not profile:
-                        continue
-                        
-                    business_info = {
-                        'user_id': account.user_id,
-                        'vk_account_id': account.id,
-                        'vk_group_id': account.group_id,
-                        'access_token': account.access_token,
-                        'description': profile.description,
-                        'business_type': profile.niche,
-                        # ... остальные поля по необходимости
-                        'connected_platforms': ['vk']
-                    }
-                    
-                    # Создаем платформу и запускаем генерацию
-                    platform = ContentPlatform(business_info)
-                    platform.auto_replenish_queue(count_to_generate=5)
+            # Запрос 1: активные аккаунты + глубина очереди одним GROUP BY
+            # (считаем и запланированные, и черновики)
+            queue_depth = db.session.query(
+                DBScheduledPost.vk_account_id.label('vk_account_id'),
+                func.count(DBScheduledPost.id).label('pending_count')
+            ).filter(
+                DBScheduledPost.status.in_(['scheduled', 'draft'])
+            ).group_by(DBScheduledPost.vk_account_id).subquery()
+
+            rows = db.session.query(
+                VKAccount,
+                func.coalesce(queue_depth.c.pending_count, 0)
+            ).outerjoin(
+                queue_depth, queue_depth.c.vk_account_id == VKAccount.id
+            ).filter(VKAccount.is_active == True).all()
+
+            QUEUE_DEPTH.replace_all({(account.id,): pending_count for account, pending_count in rows})
+
+            # ЕСЛИ ОЧЕРЕДЬ ПУСТА -> ГЕНЕРИРУЕМ ЕЩЕ 5
+            # (кроме аккаунтов с мертвым токеном: публиковать сгенерированное все равно некуда)
+            empty_accounts = [
+                account for account, pending_count in rows
+                if pending_count == 0 and vk_account_cache.is_token_alive(account.access_token)
+            ]
+            logger.info(f"Активных аккаунтов: {len(rows)}, с пустой очередью: {len(empty_accounts)}")
+            if not empty_accounts:
+                return
+
+            # Запрос 2: профили бизнеса для всех пустых аккаунтов разом
+            profiles = {}
+            for profile in BusinessProfile.query.filter(
+                BusinessProfile.user_id.in_({account.user_id for account in empty_accounts})
+            ).all():
+                profiles.setdefault(profile.user_id, profile)
+
+            for account in empty_accounts:
+                # Собираем business_info для платформы
+                profile = profiles.get(account.user_id)
+                if not profile:
+                    continue
                     
-                    # После генерации нужно обновить задачи в памяти (перезагрузить шедулер)
-                    self.restore_schedule_for_account(account.id, platform.scheduler)
+                business_info = {
+                    'user_id': account.user_id,
+                    'vk_account_id': account.id,
+                    'vk_group_id': account.group_id,
+                    'access_token': account.access_token,
+                    'description': profile.description,
+                    'business_type': profile.niche,
+                    # ... остальные поля по необходимости
+                    'connected_platforms': ['vk']
+                }
+
+                if self.replenish_pool.submit(account.id, self._replenish_account, business_info):
+                    logger.info(f"⚡ Очередь пуста! Автогенерация для {account.group_name} поставлена в пул")
+
+    def _replenish_account(self, business_info):
+        """Задача пула генерации: наполняет очередь одного аккаунта"""
+        with app.app_context():
+            # Создаем платформу и запускаем генерацию
+            platform = ContentPlatform(business_info)
+            platform.auto_replenish_queue(count_to_generate=5)
+            
+            # После генерации нужно обновить задачи в памяти (перезагрузить шедулер)
+            self.restore_schedule_for_account(business_info['vk_account_id'])
 
-    def restore_schedule_for_account(self, account_id, scheduler_instance):
+    def restore_schedule_for_account(self, account_id):
         """
-        Загружает задачи из БД в память планировщика конкретной платформы
+        Загружает запланированные посты аккаунта из БД в диспетчер публикаций
         """
         pending_posts = DBScheduledPost.query.filter_by(
             vk_account_id=account_id, 
             status='scheduled'
         ).all()
         
-        timezone = pytz.timezone('Europe/Moscow')
-        now = datetime.now(timezone)
-        
+        # Просроченные посты диспетчер отдаст сразу, отдельная проверка не нужна
         for db_post in pending_posts:
-            # Если задача уже есть в планировщике, пропускаем (или обновляем)
-            # Для простоты - добавляем через try/except
-            
-            if db_post.publish_date.tzinfo is None:
-                post_time = timezone.localize(db_post.publish_date)
-            else:
-                post_time = db_post.publish_date
-                
-            # Проверка на просрочку
-            run_date = post_time if post_time > now else datetime.now(timezone) + timedelta(seconds=10)
+            post_dispatcher.schedule(db_post.id, db_post.publish_date)
 
-            try:
-                scheduler_instance.scheduler.add_job(
-                    func=self._publish_wrapper,
-                    trigger=DateTrigger(run_date=run_date),
-                    args=[db_post.id, scheduler_instance], # Передаем ID и экземпляр шедулера
-                    id=str(db_post.id),
-                    replace_existing=True
-                )
-            except Exception:
-                pass # Задача уже есть или ошибка
-
-    def _publish_wrapper(self, db_post_id: int, scheduler_instance):
+    def _publish_batch(self, post_ids):
         """
-        Обертка публикации. Находит пост в БД и отправляет.
+        Публикует пачку постов (обычно одного аккаунта). Находит посты в БД и отправляет:
+        несколько постов одного токена уходят через VK execute одним запросом.
         """
         with app.app_context():
-            logger.info(f"🚀 Публикация поста ID {db_post_id}...")
-            
-            db_post = DBScheduledPost.query.get(db_post_id)
-            if not db_post or db_post.status != 'scheduled':
+            logger.info(f"🚀 Публикация постов ID {post_ids}...")
+
+            db_posts = [
+                db_post for db_post in DBScheduledPost.query.filter(DBScheduledPost.id.in_(post_ids)).all()
+                # Пост должен быть захвачен этой репликой (и аренда еще не истекла)
+                if db_post.status == 'publishing' and self.leases.owns(db_post.id)
+            ]
+            if not db_posts:
                 return
 
             # Формируем контент для паблишера
             from modules.social_api import SocialMediaPublisher
             publisher = SocialMediaPublisher()
             
-            # Находим аккаунт для токена
-            account = VKAccount.query.get(db_post.vk_account_id)
-            business_info = {
-                'vk_group_id': account.group_id,
-                'access_token': account.access_token
-            }
-            
-            content = {
-                'title': db_post.title,
-                'text': db_post.text,
-                'image_url': db_post.image_url
+            # Находим аккаунты для токенов (одним запросом)
+            accounts = {
+                account.id: account for account in VKAccount.query.filter(
+                    VKAccount.id.in_({db_post.vk_account_id for db_post in db_posts})
+                ).all()
             }
 
-            # Публикуем
-            res = publisher.publish('vk', content, business_info)
-            
-            if res['success']:
-                db_post.status = 'published'
-                db_post.is_published = True
-                db_post.vk_post_id = str(res.get('post_id'))
-                logger.info(f"✅ Успешно опубликовано! VK ID: {res.get('post_id')}")
-            else:
-                db_post.status = 'failed'
-                logger.error(f"❌ Ошибка публикации: {res.get('error')}")
-            
-            db.session.commit()
+            items = []
+            for db_post in db_posts:
+                account = accounts.get(db_post.vk_account_id)
+                business_info = {
+                    'vk_group_id': account.group_id if account else None,
+                    'access_token': account.access_token if account else None
+                }
+                content = {
+                    'title': db_post.title,
+                    'text': db_post.text,
+                    'image_url': db_post.image_url,
+                    # Ключ дедупликации VK: повтор после таймаута не создаст второй пост
+                    'guid': f"post{db_post.id}"
+                }
+                items.append((content, business_info))
+
+            # Публикуем (аренда продлевается, пока грузятся фото и идет запрос)
+            with self.leases.keep_alive([db_post.id for db_post in db_posts]):
+                if len(items) == 1:
+                    results = [publisher.publish('vk', *items[0])]
+                else:
+                    results = publisher.publish_many('vk', items)
+
+            for db_post, (content, business_info), res in zip(db_posts, items, results):
+                vk_account_cache.note_result(business_info['access_token'], res)
+                self._apply_publish_result(db_post, res)
+
+            for db_post in db_posts:
+                if db_post.status == 'scheduled':
+                    post_dispatcher.schedule(db_post.id, db_post.publish_date)
+
+    def _apply_publish_result(self, db_post, res):
+        """
+        Статус поста по результату публикации, отдельной транзакцией на каждый пост.
+        Пишется, только если пост все еще 'publishing' под арендой этой реплики.
+        """
+        if not self.leases.hold(db_post.id):
+            db.session.rollback()
+            logger.warning(f"⚠️ Аренда поста {db_post.id} потеряна, результат публикации не записан")
+            return
+
+        if res['success']:
+            original_date = self.retry_policy.original_publish_date(db_post)
+            db_post.status = 'published'
+            db_post.is_published = True
+            db_post.vk_post_id = str(res.get('post_id'))
+            self.retry_policy.handle_success(db_post)
+            if original_date:
+                PUBLISH_LAG.observe((local_now() - original_date).total_seconds(), source='daemon')
+            logger.info(f"✅ Успешно опубликовано! VK ID: {res.get('post_id')}")
+        else:
+            # Временные ошибки возвращают пост в 'scheduled' с новой publish_date
+            self.retry_policy.handle_failure(db_post, res)
+            logger.error(f"❌ Ошибка публикации: {res.get('error')} (статус: {db_post.status})")
+        PUBLISHED_POSTS.inc(source='daemon', status=db_post.status)
+        self.leases.release(db_post.id)
+        db.session.commit()
 
     def run_forever(self):
         logger.info("🏁 SUPER-DAEMON запущен! (Мониторинг + Автопостинг)")
+
+        if daemon_config.METRICS_PORT:
+            start_metrics_server(daemon_config.METRICS_PORT, host=daemon_config.METRICS_HOST)
+
+        with app.app_context():
+            post_dispatcher.load_from_db()
+
+        # Посты, запланированные задачами APScheduler (ContentPlatform, автопополнение),
+        # публикует демон: он исполнитель задач общего планировщика
+        run_jobs_in_this_process()
+
+        # Метаданные групп и валидность токенов обновляются в фоне пачками
+        vk_account_cache.start_refresher(self._load_account_tokens)
+
+        next_refill = time.monotonic()
+        next_resync = time.monotonic() + daemon_config.RESYNC_INTERVAL
+        next_change_check = time.monotonic() + daemon_config.CHANGE_CHECK_INTERVAL
         
         # Основной цикл
         while True:
             try:
                 # 1. Проверяем, нужно ли создать новые посты
-                self.check_and_refill_queues()
-                
-                # 2. Здесь мы должны дать поработать планировщикам. 
-                # Но так как мы создаем экземпляры scheduler динамически, 
-                # лучше использовать глобальный подход.
-                # В упрощенном варианте: check_and_refill_queues наполнит БД,
-                # а отдельный поток должен эти задачи исполнять.
-                
-                # ДЛЯ СТАБИЛЬНОСТИ: 
-                # Сейчас самый надежный вариант - этот скрипт занимается ГЕНЕРАЦИЕЙ,
-                # а исполнение задач (APScheduler) лучше держать внутри app.py или 
-                # вызывать здесь restore_schedule_from_db глобально.
-                
-                self.process_due_posts() # См. метод ниже
-                
-                logger.info("💤 Сплю 60 секунд перед следующей проверкой...")
-                time.sleep(60) 
+                if time.monotonic() >= next_refill:
+                    self.check_and_refill_queues()
+                    next_refill = time.monotonic() + daemon_config.REFILL_INTERVAL
+
+                # 2. Посты могли запланировать в другом процессе (веб-приложение),
+                # поэтому изредка сверяем heap диспетчера с БД. Заодно возвращаем
+                # в очередь посты упавших реплик с истекшей арендой.
+                if time.monotonic() >= next_resync:
+                    with app.app_context():
+                        self.leases.reap_expired()
+                        post_dispatcher.load_from_db()
+                    next_resync = time.monotonic() + daemon_config.RESYNC_INTERVAL
+                    next_change_check = time.monotonic() + daemon_config.CHANGE_CHECK_INTERVAL
+
+                # 2.1. Между полными сверками часто и дешево проверяем только посты,
+                # которые наступят до следующей сверки: новый пост не опоздает на RESYNC_INTERVAL
+                if time.monotonic() >= next_change_check:
+                    with app.app_context():
+                        post_dispatcher.sync_upcoming(daemon_config.RESYNC_INTERVAL)
+                    next_change_check = time.monotonic() + daemon_config.CHANGE_CHECK_INTERVAL
+
+                # 3. Спим ровно до ближайшего поста (или до следующей проверки)
+                timeout = max(0.0, min(next_refill, next_resync, next_change_check) - time.monotonic())
+                due_ids = post_dispatcher.wait_for_due(timeout=timeout)
+                if due_ids:
+                    self.process_due_posts(due_ids)
                 
             except KeyboardInterrupt:
+                logger.info("Останавливаю пулы публикации и генерации...")
+                self.publish_executor.shutdown(wait=True)
+                self.replenish_pool.shutdown()
                 break
             except Exception as e:
                 logger.error(f"Глобальная ошибка демона: {e}")
                 time.sleep(10)
 
-    def process_due_posts(self):
+    def _load_account_tokens(self):
+        with app.app_context():
+            return [
+                (row.group_id, row.access_token)
+                for row in db.session.query(VKAccount.group_id, VKAccount.access_token).filter(
+                    VKAccount.is_active == True
+                ).all()
+            ]
+
+    def process_due_posts(self, post_ids=None):
         """
-        Простой поллинг базы вместо сложного APScheduler в памяти.
-        Берет посты, у которых время пришло, и публикует их.
+        Публикует посты, время которых пришло.
+        post_ids отдает диспетчер; без них — разовый поиск просроченных постов в БД.
+        В работу уходят только посты, атомарно захваченные этой репликой.
         """
         with app.app_context():
-            timezone = pytz.timezone('Europe/Moscow')
-            now = datetime.now(timezone)
-            
-            # Ищем посты, которые 'scheduled' и время уже наступило (или прошло)
-            due_posts = DBScheduledPost.query.filter(
-                DBScheduledPost.status == 'scheduled',
-                DBScheduledPost.publish_date <= now.replace(tzinfo=None) # Сравниваем без tz если в базе naive
-            ).all()
+            if post_ids is None:
+                # Ищем посты, которые 'scheduled' и время уже наступило (или прошло)
+                post_ids = [row.id for row in DBScheduledPost.query.filter(
+                    DBScheduledPost.status == 'scheduled',
+                    DBScheduledPost.publish_date <= local_now()
+                ).all()]
+
+            # Посты аккаунтов с мертвым токеном не захватываем: они остаются 'scheduled'
+            # и уйдут, когда пользователь обновит токен
+            post_ids = self._skip_dead_tokens(post_ids)
             
-            for post in due_posts:
-                # Чтобы не создать дубли, можно использовать фиктивный scheduler_instance или None
-                self._publish_wrapper(post.id, None)
+            claimed = self.leases.claim(post_ids)
+            if not claimed:
+                return
+
+            # Группируем по аккаунту: посты одного токена публикуются одним execute
+            by_account = {}
+            for row in db.session.query(DBScheduledPost.id, DBScheduledPost.vk_account_id).filter(
+                DBScheduledPost.id.in_(claimed)
+            ).all():
+                by_account.setdefault(row.vk_account_id, []).append(row.id)
+
+            for account_post_ids in by_account.values():
+                for start in range(0, len(account_post_ids), EXECUTE_BATCH_SIZE):
+                    self._submit_publish(account_post_ids[start:start + EXECUTE_BATCH_SIZE])
+
+    def _skip_dead_tokens(self, post_ids):
+        if not post_ids:
+            return post_ids
+        rows = db.session.query(DBScheduledPost.id, VKAccount.access_token).join(
+            VKAccount, VKAccount.id == DBScheduledPost.vk_account_id
+        ).filter(DBScheduledPost.id.in_(post_ids)).all()
+        dead = {row.id for row in rows if not vk_account_cache.is_token_alive(row.access_token)}
+        if dead:
+            logger.warning(f"🔒 Пропущено постов с недействительным токеном: {len(dead)}")
+        return [post_id for post_id in post_ids if post_id not in dead]
+
+    def _submit_publish(self, post_ids):
+        """Отправляет пачку постов в пул публикации (кроме тех, что уже в работе)"""
+        with self._in_flight_lock:
+            post_ids = [post_id for post_id in post_ids if post_id not in self._in_flight]
+            self._in_flight.update(post_ids)
+        if not post_ids:
+            return
+
+        future = self.publish_executor.submit(self._publish_batch, post_ids)
+        future.add_done_callback(lambda f: self._on_publish_done(post_ids, f))
+
+    def _on_publish_done(self, post_ids, future):
+        with self._in_flight_lock:
+            self._in_flight.difference_update(post_ids)
+        if future.exception():
+            logger.error(f"Ошибка в потоке публикации постов {post_ids}: {future.exception()}")
 
 if __name__ == "__main__":
     daemon = PublisherDaemon()
@@ -1,10 +1,17 @@
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+from langchain_core.messages import AIMessage
 from urllib.parse import quote
 import requests
 import os
+import json
 from datetime import datetime, timedelta
 
+from modules.stop_words import stop_word_matcher
+from modules.theme_index import theme_index
+from utils.llm_cache import llm_cache
+from utils.metrics import LLM_REQUEST_DURATION
+
 load_dotenv(dotenv_path='os.env')
 api_key = os.getenv("INFERENCE_API_KEY")
 
@@ -15,6 +22,23 @@ class AIService:
             base_url="https://api.inference.net/v1",
             api_key=api_key
         )
+
+    def _invoke(self, prompt, cache=True, validate=None):
+        """
+        Единая точка вызова LLM (с замером времени ответа и кэшем ответов).
+        validate(text) -> bool решает, можно ли кэшировать ответ (по умолчанию — любой непустой).
+        Генерация контента (стратегия, темы, посты) идет с cache=False: на повторный запрос
+        пользователь ждет новый текст, а не тот же ответ из кэша
+        """
+        def request():
+            with LLM_REQUEST_DURATION.time(client='inference'):
+                return self.llm.invoke(prompt).content
+
+        if not cache:
+            return AIMessage(content=request())
+        # Ответ из кэша оборачиваем в то же сообщение: вызывающие читают .content или .text
+        return AIMessage(content=llm_cache.get_or_call(self.llm.model_name, prompt, request,
+                                                         validate=validate or (lambda text: bool(text.strip()))))
     
     def generate_strategy_preview(self, user_id):
         from models import BusinessProfile
@@ -24,7 +48,7 @@ class AIService:
         context = f"Ниша: {profile.niche}, Описание: {profile.description}, ЦА: {profile.target_audience}, Цели: {profile.goals}, Стоп-слова: {profile.stop_words}"
         prompt = f"На основе данных: {context}. Подготовь краткую SMM-стратегию (до 500 симв). Не используй markdown-разметку."
         
-        response = self.llm.invoke(prompt)
+        response = self._invoke(prompt, cache=False)
         return response.content # Возвращаем текст, не сохраняя в БД
 
     def generate_theme_ideas(self, user_id, strategy):
@@ -43,7 +67,7 @@ class AIService:
         Ответь ТОЛЬКО списком тем, каждая с новой строки, без цифр и лишнего текста. Темы, которые уже есть в базе не предлагай: {listThemes}."""
         
         try:
-            response = self.llm.invoke(prompt)
+            response = self._invoke(prompt, cache=False)
             # Получаем текст ответа (зависит от версии langchain, обычно response.content)
             ideas_text = response.content.strip() 
             
@@ -54,11 +78,14 @@ class AIService:
                 if idea.strip()
             ][:5] # Берем ровно 5
 
+            new_themes = []
             for theme_text in ideas_list:
                 new_theme = PostTheme(user_id=user_id, theme_text=theme_text)
                 db.session.add(new_theme)
+                new_themes.append(new_theme)
             
             db.session.commit()
+            theme_index.add(user_id, [(t.id, t.theme_text) for t in new_themes])
             print(f"✅ Успешно сохранено {len(ideas_list)} тем в БД для пользователя {user_id}")
             return ideas_list
             
@@ -78,13 +105,94 @@ class AIService:
         Максимальная длина поста - 500 символов. Не применяй Markdown-разметку"""
         
         try:
-            response_text = self.llm.invoke(prompt_text)
+            response_text = self._invoke(prompt_text, cache=False)
             description = response_text.text.strip()
             return description
         except Exception as e:
             print(f"Ошибка генерации текста: {str(e)}")
             return None
             
+    def generate_posts_batch(self, ideas, with_image_prompts=True, fallback=True):
+        """
+        Тексты постов (и промпты картинок) для списка идей одним запросом к LLM.
+        Возвращает список в порядке идей: {'text': ..., 'image_prompt': ...} или None.
+        Элементы, которых нет в ответе или которые не прошли проверку, при fallback=True
+        догенерируются поштучно, иначе остаются None.
+        """
+        if not ideas:
+            return []
+
+        themes = "\n".join(f"{i}. {idea}" for i, idea in enumerate(ideas, 1))
+        image_rule = ""
+        image_field = ""
+        if with_image_prompts:
+            image_rule = "Для каждой темы также придумай промпт для яркой и привлекательной картинки, промпт должен состоять из одного слова."
+            image_field = ', "image_prompt": "промпт картинки"'
+        prompt = f"""Ты нейросеть, которая публикует посты в VK.
+        Создай по одному посту на каждую тему из списка.
+        Сделай каждый пост интересным и информативным, чтобы привлечь внимание аудитории.
+        В конце каждого поста напиши теги по теме поста через запятую.
+        Максимальная длина поста - 500 символов. Не применяй Markdown-разметку.
+        {image_rule}
+        Темы:
+        {themes}
+        Ответь ТОЛЬКО JSON без пояснений:
+        {{"posts": [{{"id": номер темы, "text": "текст поста"{image_field}}}]}}"""
+
+        try:
+            response = self._invoke(prompt, cache=False)
+            parsed = self._parse_posts_batch(response.content, len(ideas), with_image_prompts)
+        except Exception as e:
+            print(f"Ошибка пакетной генерации постов: {str(e)}")
+            parsed = {}
+
+        if len(parsed) < len(ideas):
+            print(f"⚠️ Пакетная генерация: готово {len(parsed)} из {len(ideas)}")
+
+        results = []
+        for i, idea in enumerate(ideas):
+            item = parsed.get(i)
+            if item is None and fallback:
+                text = self.generate_post_content(idea)
+                item = {'text': text, 'image_prompt': None} if text else None
+            if item is not None and with_image_prompts and not item['image_prompt'] and fallback:
+                item['image_prompt'] = self.generate_image_prompt(idea)
+            results.append(item)
+        return results
+
+    @staticmethod
+    def _parse_posts_batch(raw, count, with_image_prompts=True):
+        """Разбор ответа пакетной генерации: {индекс идеи: {'text', 'image_prompt'}} только для валидных элементов"""
+        start, end = raw.find('{'), raw.rfind('}')
+        if start == -1 or end <= start:
+            return {}
+        try:
+            data = json.loads(raw[start:end + 1])
+        except ValueError:
+            return {}
+
+        posts = data.get('posts') if isinstance(data, dict) else None
+        if not isinstance(posts, list):
+            return {}
+
+        parsed = {}
+        for post in posts:
+            if not isinstance(post, dict):
+                continue
+            try:
+                index = int(post.get('id')) - 1
+            except (TypeError, ValueError):
+                continue
+            text = post.get('text')
+            if not 0 <= index < count or index in parsed or not isinstance(text, str) or not text.strip():
+                continue
+            image_prompt = post.get('image_prompt') if with_image_prompts else None
+            parsed[index] = {
+                'text': text.strip(),
+                'image_prompt': image_prompt.strip() if isinstance(image_prompt, str) and image_prompt.strip() else None
+            }
+        return parsed
+
     def generate_planned_date(self, idea, strategy):
         today = datetime.utcnow().strftime('%Y-%m-%d')
         prompt = f"""Ты SMM-планировщик. 
@@ -94,7 +202,7 @@ class AIService:
         Ответь ТОЛЬКО в формате: ГГГГ-ММ-ДД ЧЧ:ММ"""
         
         try:
-            response = self.llm.invoke(prompt)
+            response = self._invoke(prompt)
             date_str = response.content.strip()
             # Парсим строку в объект datetime
             return datetime.strptime(date_str, '%Y-%m-%d %H:%M')
@@ -104,41 +212,24 @@ class AIService:
             return datetime.utcnow() + timedelta(hours=2)
     
     def check_on_idea(self, user_id, description, idea):
-        from models import PostTheme, BusinessProfile
-        """Проверка идеи на дубли с архивом тем"""
+        from models import BusinessProfile
+        """Проверка идеи на дубли с архивом тем (локально, по индексу тем пользователя)"""
 
-        # Берем ВСЕ темы из базы
-        all_themes = PostTheme.query.filter_by(user_id=user_id).order_by(PostTheme.id.desc()).all()
         profile = BusinessProfile.query.filter_by(user_id=user_id).first()
-        
-        archive_themes = [t.theme_text for t in all_themes][5:] # Пропускаем первые 5 новых
-        print(profile.stop_words)
-        if not archive_themes:
-            return "НОВАЯ ТЕМА"
-
-        # Улучшенный промпт с четкой логикой
-        prompt = f"""Инструкция: Сравни новую тему с архивом прошлых постов. 
-        Если новая тема по смыслу ДУБЛИРУЕТ одну из старых, ответь "ДУБЛЬ: [текст старой темы]".
-        Если тема уникальна и не повторяет архив, ответь "УНИКАЛЬНО".
-        Если в тексте поста есть стоп-слова или они похожи по смыслу, также пиши "ДУБЛЬ": [Текст поста и капслоком то, где ты нашел стоп-слова]. 
-        Новая тема: {idea}
-        Текст поста: {description}
-        Стоп-слова: {profile.stop_words}
-        Архив тем:
-        {chr(10).join(archive_themes)}
-        """
+        matcher = stop_word_matcher(profile.stop_words if profile else None)
+        if matcher.find(description):
+            return f"ДУБЛЬ: {matcher.highlight(description)}"
 
         try:
-            response = self.llm.invoke(prompt)
-            res_text = response.content.strip()
-            
-            if "ДУБЛЬ" in res_text.upper():
-                return res_text # Вернет "ДУБЛЬ: Название темы"
-            return "НОВАЯ ТЕМА"
-        
+            # Пропускаем 5 самых новых тем: это текущая пачка идей
+            duplicate = theme_index.find_duplicate(user_id, idea, skip_latest=5)
         except Exception as e:
             print(f"Ошибка проверки: {e}")
             return "НОВАЯ ТЕМА"
+
+        if duplicate:
+            return f"ДУБЛЬ: {duplicate[0]}"
+        return "НОВАЯ ТЕМА"
         
     def generate_image_prompt(self, idea):
         """Генерация промпта для изображения"""
@@ -148,7 +239,7 @@ class AIService:
         Ничего не говори, только говори промпт. Причем промпт должен состоять из одного слова."""
         
         try:
-            response_image = self.llm.invoke(prompt_image)
+            response_image = self._invoke(prompt_image)
             image_prompt = response_image.text.strip()
             return image_prompt
         except Exception as e:
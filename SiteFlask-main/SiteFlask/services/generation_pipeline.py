@@ -0,0 +1,123 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+
+from config.settings import ai_config
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class GenerationPipeline:
+    """
+    Конвейер генерации постов по темам: текст -> модерация -> промпт картинки.
+    Тексты и промпты картинок для первых count тем запрашиваются одним пакетным вызовом;
+    чего в пакете не оказалось, догенерируется поштучно.
+    Темы обрабатываются параллельно (не больше max_workers одновременно), этапы одной
+    темы идут по порядку. Новые темы перестают запускаться, как только набралось
+    нужное число одобренных постов, поэтому лишние вызовы LLM не тратятся.
+    """
+
+    def __init__(self, moderator=None, generate_images: bool = True, max_workers: int = None):
+        self.moderator = moderator
+        self.generate_images = generate_images
+        self.max_workers = max_workers or ai_config.GENERATION_CONCURRENCY
+
+    def _prefetch(self, themes: List[str]) -> Dict[int, Dict]:
+        """Черновики {индекс темы: {'text', 'image_prompt'}} одним запросом к LLM"""
+        from services.ai_service import ai_service
+
+        themes = themes[:ai_config.GENERATION_BATCH_SIZE]
+        if not themes:
+            return {}
+        try:
+            drafts = ai_service.generate_posts_batch(themes, with_image_prompts=self.generate_images, fallback=False)
+        except Exception as e:
+            logger.error(f"Ошибка пакетной генерации: {e}")
+            return {}
+        return {index: draft for index, draft in enumerate(drafts) if draft}
+
+    def _process_theme(self, theme: str, draft: Optional[Dict] = None) -> Optional[Dict]:
+        """Все этапы одной темы. None — если текст не сгенерирован или пост отклонен"""
+        from services.ai_service import ai_service
+
+        draft = draft or {}
+
+        # Генерация текста (если ее нет в пакете)
+        message = draft.get('text') or ai_service.generate_post_content(theme)
+        if not message:
+            return None
+
+        # --- МОДЕРАЦИЯ ---
+        if self.moderator is not None:
+            mod_result = self.moderator.moderate_content({
+                'title': theme,
+                'text': message,
+                'topic': theme
+            })
+            if not mod_result.passed:
+                logger.warning(f"Пост '{theme}' отклонен модератором: {mod_result.issues}")
+                return None
+
+        # --- ГЕНЕРАЦИЯ ИЗОБРАЖЕНИЯ ---
+        image_url = None
+        if self.generate_images:
+            try:
+                img_prompt = draft.get('image_prompt') or ai_service.generate_image_prompt(theme)
+                if img_prompt:
+                    image_url = ai_service.generate_image_url(img_prompt)
+            except Exception as e:
+                logger.error(f"Ошибка Image AI для '{theme}': {e}")
+
+        return {
+            'title': theme,
+            'text': message,
+            'image_url': image_url,
+            'content_type': 'post'
+        }
+
+    def run(self, themes: List[str], count: int = None) -> List[Dict]:
+        """
+        Возвращает до count готовых постов в порядке тем.
+        Уже запущенные темы дорабатывают, но их лишние результаты отбрасываются.
+        """
+        count = len(themes) if count is None else count
+        if not themes or count <= 0:
+            return []
+
+        drafts = self._prefetch(themes[:count])
+
+        results = {}
+        pending_themes = iter(enumerate(themes))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="generation") as executor:
+            in_flight = {}
+
+            def submit_next():
+                # Запускаем тему, только если одобренных плюс выполняемых еще не хватает
+                if len(results) + len(in_flight) >= count:
+                    return False
+                item = next(pending_themes, None)
+                if item is None:
+                    return False
+                index, theme = item
+                in_flight[executor.submit(self._process_theme, theme, drafts.get(index))] = index
+                return True
+
+            while len(in_flight) < self.max_workers and submit_next():
+                pass
+
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = in_flight.pop(future)
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        logger.error(f"Ошибка генерации поста '{themes[index]}': {e}")
+                        content = None
+                    if content:
+                        results[index] = content
+
+                while len(in_flight) < self.max_workers and submit_next():
+                    pass
+
+        return [results[index] for index in sorted(results)][:count]
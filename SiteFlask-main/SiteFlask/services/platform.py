@@ -4,8 +4,10 @@ import json
 
 from modules.ai_moderator import AIContentModerator
 from modules.ai_scheduler import AIContentScheduler
+from services.generation_pipeline import GenerationPipeline
 from models import db, Post, ModerationLog # Ваши модели
 from utils.logger import get_logger
+from utils.metrics import GENERATED_POSTS
 
 logger = get_logger(__name__)
 
@@ -65,6 +67,7 @@ class ContentPlatform:
             # Сохраняем запланированное в БД
             for post in scheduled_posts:
                 self._save_scheduled_post_to_db(post)
+            GENERATED_POSTS.inc(len(scheduled_posts), source='manual')
                 
         # Формируем красивый отчет для frontend
         return {
@@ -141,43 +144,9 @@ class ContentPlatform:
             logger.error("AI не вернул идей для постов")
             return 0
 
-        generated_content_list = []
-
-        # 2. Цикл генерации и модерации (как в vk_service)
-        for theme in themes:
-            if len(generated_content_list) >= count_to_generate:
-                break
-
-            # Генерация текста
-            message = ai_service.generate_post_content(theme)
-            
-            content_to_moderate = {
-                'title': theme,
-                'text': message,
-                'topic': theme
-            }
-            
-            # --- МОДЕРАЦИЯ ---
-            mod_result = self.moderator.moderate_content(content_to_moderate)
-            if not mod_result.passed:
-                logger.warning(f"Пост '{theme}' отклонен модератором: {mod_result.issues}")
-                continue 
-
-            # --- ГЕНЕРАЦИЯ ИЗОБРАЖЕНИЯ ---
-            image_url = None
-            try:
-                img_prompt = ai_service.generate_image_prompt(theme)
-                if img_prompt:
-                    image_url = ai_service.generate_image_url(img_prompt)
-            except Exception as e:
-                logger.error(f"Ошибка Image AI для '{theme}': {e}")
-
-            generated_content_list.append({
-                'title': theme,
-                'text': message,
-                'image_url': image_url,
-                'content_type': 'post'
-            })
+        # 2. Генерация и модерация (как в vk_service), темы обрабатываются параллельно
+        pipeline = GenerationPipeline(moderator=self.moderator)
+        generated_content_list = pipeline.run(themes, count=count_to_generate)
 
         if not generated_content_list:
             logger.warning("Ни один пост не прошел модерацию.")
@@ -192,9 +161,12 @@ class ContentPlatform:
         
         start_date = last_post.publish_date if last_post else datetime.now()
 
+        # Только расписание: черновики ниже ждут одобрения и публикуются демоном,
+        # задачи APScheduler для них не нужны
         scheduled_posts = self.scheduler.create_posting_schedule(
             content_list=generated_content_list,
-            start_date=start_date
+            start_date=start_date,
+            add_jobs=False
         )
 
         # 4. СОХРАНЕНИЕ В БД
@@ -218,5 +190,6 @@ class ContentPlatform:
                 logger.error(f"Ошибка сохранения: {e}")
         
         db.session.commit()
+        GENERATED_POSTS.inc(count, source='auto_replenish')
         logger.info(f"✅ Успешно добавлено {count} постов в очередь.")
         return count
\ No newline at end of file
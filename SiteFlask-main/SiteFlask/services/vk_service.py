@@ -6,6 +6,7 @@ from models import VKAccount, Post, db, BusinessProfile
 from services.ai_service import ai_service
 from modules.ai_scheduler import AIContentScheduler
 from modules.ai_moderator import AIContentModerator
+from services.generation_pipeline import GenerationPipeline
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -48,53 +49,18 @@ def api_vk_auto_generate():
         strategy = profile.BusinessPrompt or profile.description
         themes = ai_service.generate_theme_ideas(user_id, strategy)
         
-        generated_content_list = []
-
-        # 3. Генерация контента и Модерация
-        for theme in themes:
-            # Генерация текста
-            message = ai_service.generate_post_content(theme)
-            
-            # Подготовка объекта для модератора
-            content_to_moderate = {
-                'title': theme,
-                'text': message,
-                'topic': theme
-            }
-            
-            # --- НОВАЯ МОДЕРАЦИЯ ---
-            mod_result = moderator.moderate_content(content_to_moderate)
-            print(mod_result)
-            if not mod_result.passed:
-                logger.warning(f"Пост '{theme}' не прошел модерацию: {mod_result.issues}")
-                continue # Пропускаем плохой контент
-
-            # Генерация изображения (если прошел модерацию)
-            img_prompt = ai_service.generate_image_prompt(theme)
-            
-            image_url = None
-            try:
-                img_prompt = ai_service.generate_image_prompt(theme)
-                if img_prompt:
-                    image_url = ai_service.generate_image_url(img_prompt)
-            except Exception as e:
-                logger.error(f"Не удалось создать картинку для {theme}: {e}")
-
-            generated_content_list.append({
-                'title': theme,
-                'text': message,
-                'image_url': image_url, # Ссылка полетит в планировщик
-                'content_type': 'post'
-            })
+        # 3. Генерация контента и Модерация (темы параллельно, картинка — после модерации)
+        generated_content_list = GenerationPipeline(moderator=moderator).run(themes)
 
         if not generated_content_list:
             return jsonify({'success': False, 'error': 'Контент не прошел модерацию'}), 400
 
         # 4. --- НОВОЕ ПЛАНИРОВАНИЕ (AI Scheduler) ---
-        # Планировщик сам выберет лучшие времена и создаст задачи
+        # Планировщик сам выберет лучшие времена. Задачи APScheduler не создаем:
+        # посты ниже сохраняются как 'scheduled', их публикует демон
         scheduled_posts = scheduler.create_posting_schedule(
             content_list=generated_content_list,
-            posts_per_week=5
+            add_jobs=False
         )
         print(scheduled_posts)
         # 5. Сохранение в базу данных для отображения в интерфейсе
@@ -0,0 +1,146 @@
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import and_, or_
+
+from config.settings import vk_config
+from modules.vk_transport import vk_transport
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _item_metrics(item: Dict) -> Dict:
+    return {
+        'likes': item.get('likes', {}).get('count', 0),
+        'views': item.get('views', {}).get('count', 0),
+        'shares': item.get('reposts', {}).get('count', 0),
+        'comments': item.get('comments', {}).get('count', 0),
+    }
+
+
+class WallSync:
+    """
+    Инкрементальная синхронизация метрик постов со стены группы VK.
+    Листает wall.get по offset от новых постов к старым и останавливается, когда дошла
+    до отметки прошлой синхронизации и посты старше окна, в котором метрики еще меняются.
+    Посты ищутся в БД одним IN-запросом, метрики пишутся одним bulk update.
+    """
+
+    def __init__(self, page_size: int = None, lookback_days: int = None, max_pages: int = None):
+        self.page_size = page_size or vk_config.WALL_SYNC_PAGE_SIZE
+        self.lookback_seconds = (lookback_days or vk_config.WALL_SYNC_LOOKBACK_DAYS) * 86400
+        self.max_pages = max_pages or vk_config.WALL_SYNC_MAX_PAGES
+
+    def _fetch_items(self, account, last_post_id: int) -> List[Dict]:
+        """Новые и недавние посты стены (без закрепленного)"""
+        cutoff = time.time() - self.lookback_seconds
+        items = []
+
+        for page in range(self.max_pages):
+            wall_res = vk_transport.call('wall.get', {
+                'access_token': account.access_token,
+                'v': vk_config.API_VERSION,
+                'owner_id': f"-{account.group_id}",  # Минус для группы обязателен
+                'count': self.page_size,
+                'offset': page * self.page_size,
+                'extended': 0
+            })
+            if 'error' in wall_res:
+                raise RuntimeError(f"VK wall.get: {wall_res['error'].get('error_msg')}")
+
+            page_items = wall_res['response']['items']
+            reached_mark = False
+            for item in page_items:
+                # Закрепленный пост стоит первым вне хронологии
+                if item.get('is_pinned'):
+                    if item.get('date', 0) >= cutoff or item['id'] > last_post_id:
+                        items.append(item)
+                    continue
+                if item['id'] <= last_post_id and item.get('date', 0) < cutoff:
+                    reached_mark = True
+                    break
+                items.append(item)
+
+            if reached_mark or len(page_items) < self.page_size:
+                break
+
+        return items
+
+    def sync_account(self, account) -> int:
+        """Обновляет метрики постов аккаунта. Возвращает число измененных постов. Коммит — за вызывающим"""
+        from models import db, Post, VKSyncState
+
+        state = VKSyncState.query.get(account.id)
+        if state is None:
+            state = VKSyncState(vk_account_id=account.id, last_post_id=0)
+            db.session.add(state)
+
+        items = self._fetch_items(account, state.last_post_id or 0)
+        if not items:
+            state.last_synced_at = datetime.now()
+            return 0
+
+        # Демон пишет в vk_post_id голый id поста, планировщик — в формате -GROUPID_POSTID
+        full_ids, bare_ids = {}, {}
+        for item in items:
+            metrics = _item_metrics(item)
+            full_ids[f"{item['owner_id']}_{item['id']}"] = metrics
+            bare_ids[str(item['id'])] = metrics
+        metrics_by_vk_id = {**bare_ids, **full_ids}
+
+        # Полный id однозначен и без фильтра по аккаунту (посты планировщика создаются
+        # без vk_account_id), голые id разных групп совпадают — их ищем только у аккаунта
+        posts = db.session.query(
+            Post.id, Post.vk_post_id, Post.likes, Post.views, Post.shares, Post.comments
+        ).filter(
+            or_(
+                Post.vk_post_id.in_(list(full_ids)),
+                and_(Post.vk_account_id == account.id, Post.vk_post_id.in_(list(bare_ids)))
+            )
+        ).all()
+
+        mappings = []
+        for post in posts:
+            metrics = metrics_by_vk_id[post.vk_post_id]
+            current = {'likes': post.likes, 'views': post.views, 'shares': post.shares, 'comments': post.comments}
+            if current != metrics:
+                mappings.append({'id': post.id, **metrics})
+
+        if mappings:
+            db.session.bulk_update_mappings(Post, mappings)
+
+        state.last_post_id = max(state.last_post_id or 0, max(item['id'] for item in items))
+        state.last_synced_at = datetime.now()
+        logger.info(f"🔄 Стена группы {account.group_id}: получено {len(items)} постов, обновлено {len(mappings)}")
+        return len(mappings)
+
+
+def save_group_stats(account, stats_period: Dict, members_count: int = None):
+    """
+    Записывает статистику группы за сутки (элемент ответа stats.get) в VKStatistic:
+    одна запись на аккаунт в день, повторные обходы ее обновляют. Коммит — за вызывающим.
+    """
+    from models import db, VKStatistic
+
+    today = datetime.now().date()
+    stat_record = VKStatistic.query.filter_by(vk_account_id=account.id, date=today).first()
+    if not stat_record:
+        stat_record = VKStatistic(vk_account_id=account.id, date=today)
+        db.session.add(stat_record)
+
+    activity = stats_period.get('activity', {})
+    stat_record.reach = stats_period.get('reach', {}).get('reach', 0)
+    stat_record.views = stats_period.get('visitors', {}).get('views', 0)
+    stat_record.likes = activity.get('likes', 0)
+    stat_record.comments = activity.get('comments', 0)
+    stat_record.shares = activity.get('copies', 0)
+    stat_record.engagement = stat_record.likes + stat_record.comments + stat_record.shares
+    if members_count is not None:
+        stat_record.followers_count = members_count
+    stat_record.updated_at = datetime.now()
+    return stat_record
+
+
+wall_sync = WallSync()
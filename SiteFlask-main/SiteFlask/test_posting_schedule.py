@@ -0,0 +1,50 @@
+# test_posting_schedule.py
+from datetime import datetime
+
+import numpy as np
+
+from modules.posting_time_optimizer import PostingTimeOptimizer, HOURS_PER_DAY, DAYS_PER_WEEK
+
+
+def best_hour_matrix(hour):
+    """Матрица, где лучший час каждого дня недели — hour"""
+    matrix = np.zeros((DAYS_PER_WEEK, HOURS_PER_DAY))
+    matrix[:, hour] = 1.0
+    return matrix
+
+
+def test_batch_gets_one_post_per_day():
+    optimizer = PostingTimeOptimizer()
+    now = datetime(2026, 10, 17, 12, 0)
+
+    slots = optimizer.next_slots(best_hour_matrix(8), 5, start=now, now=now)
+
+    # Сегодняшние 08:00 уже прошли: пачка начинается завтра, по посту в день
+    assert slots == [datetime(2026, 10, day, 8, 0) for day in range(18, 23)]
+
+
+def test_batch_starts_today_when_best_hour_is_ahead():
+    optimizer = PostingTimeOptimizer()
+    now = datetime(2026, 10, 17, 6, 30)
+
+    slots = optimizer.next_slots(best_hour_matrix(8), 3, start=now, now=now)
+
+    assert slots == [datetime(2026, 10, day, 8, 0) for day in (17, 18, 19)]
+    assert len(set(slots)) == len(slots)
+
+
+def test_batch_uses_best_hour_of_each_weekday():
+    optimizer = PostingTimeOptimizer()
+    matrix = np.zeros((DAYS_PER_WEEK, HOURS_PER_DAY))
+    matrix[5, 10] = 1.0  # Сб 10:00
+    matrix[6, 19] = 1.0  # Вс 19:00
+    matrix[0, 9] = 1.0   # Пн 09:00
+    now = datetime(2026, 10, 17, 0, 0)  # Суббота
+
+    slots = optimizer.next_slots(matrix, 3, start=now, now=now)
+
+    assert slots == [
+        datetime(2026, 10, 17, 10, 0),
+        datetime(2026, 10, 18, 19, 0),
+        datetime(2026, 10, 19, 9, 0),
+    ]
@@ -0,0 +1,132 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from config.settings import ai_config
+from utils.logger import get_logger
+from utils.metrics import LLM_CACHE_REQUESTS
+
+logger = get_logger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Промпты — многострочные f-строки с отступами: схлопываем пробелы, чтобы ключ не зависел от форматирования"""
+    return re.sub(r'\s+', ' ', prompt).strip()
+
+
+class LLMCache:
+    """
+    Кэш ответов LLM в SQLite: ключ — модель + нормализованный промпт.
+    Записи живут ttl секунд, при превышении max_entries вытесняются давно не читанные (LRU).
+    Файл общий для веб-приложения, демона и сборщика. Ошибки кэша не ломают вызов LLM.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None, enabled: bool = None):
+        self.path = path or ai_config.LLM_CACHE_PATH
+        self.ttl = ttl or ai_config.LLM_CACHE_TTL
+        self.max_entries = max_entries or ai_config.LLM_CACHE_MAX_ENTRIES
+        self.enabled = ai_config.LLM_CACHE_ENABLED if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+                " created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, prompt: str) -> str:
+        return hashlib.sha256(f"{model}\x00{normalize_prompt(prompt)}".encode('utf-8')).hexdigest()
+
+    def get(self, model: str, prompt: str) -> Optional[str]:
+        key = self.make_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ? AND created_at >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            conn.commit()
+            return row[0]
+
+    def set(self, model: str, prompt: str, response: str):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(model, prompt), model, response, now, now)
+            )
+            self._evict(conn, now)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        overflow = conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY accessed_at LIMIT ?)",
+                (overflow,)
+            )
+
+    def get_or_call(self, model: str, prompt: str, call: Callable[[], str],
+                    validate: Callable[[str], object] = None) -> str:
+        """
+        Ответ из кэша или результат call() (сохраняется в кэш).
+        validate(response) может отклонить ответ (вернуть False или бросить исключение) —
+        такой ответ возвращается, но не кэшируется.
+        """
+        if not self.enabled:
+            return call()
+
+        try:
+            cached = self.get(model, prompt)
+        except Exception as e:
+            logger.warning(f"Кэш LLM недоступен: {e}")
+            return call()
+
+        if cached is not None:
+            self.hits += 1
+            LLM_CACHE_REQUESTS.inc(result='hit')
+            return cached
+
+        self.misses += 1
+        LLM_CACHE_REQUESTS.inc(result='miss')
+        response = call()
+
+        try:
+            if response is not None and (validate is None or validate(response) is not False):
+                self.set(model, prompt, response)
+        except Exception as e:
+            logger.warning(f"Ответ LLM не сохранен в кэш: {e}")
+        return response
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hits / total if total else 0.0}
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM llm_cache")
+            conn.commit()
+
+
+llm_cache = LLMCache()
@@ -0,0 +1,288 @@
+"""
+Локальный имитатор VK API для нагрузочного тестирования демона и сборщика аналитики.
+
+Запуск:
+    python vk_simulator.py --port 8090 --latency 0.1 --error-rate 0.05 --rate-limit 3
+
+Затем направить клиентов на него:
+    VK_API_BASE_URL=http://127.0.0.1:8090/method python run_publisher.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+
+from modules.rate_limiter import TokenBucketRegistry
+
+ERROR_MESSAGES = {
+    5: 'User authorization failed: no access_token passed.',
+    6: 'Too many requests per second',
+    10: 'Internal server error',
+    100: 'One of the parameters specified was missing or invalid',
+}
+
+
+class VKError(Exception):
+    def __init__(self, code: int, message: str = None):
+        super().__init__(message or ERROR_MESSAGES.get(code, 'Unknown error'))
+        self.code = code
+
+
+class VKSimulatorState:
+    """Стены, фото и счетчики групп в памяти процесса"""
+
+    def __init__(self):
+        self.walls = {}  # group_id -> [post, ...] (новые в конце)
+        self.photos = {}  # upload token -> group_id
+        self.saved_photos = 0
+        self.lock = threading.Lock()
+
+    def wall(self, group_id: int):
+        return self.walls.setdefault(group_id, [])
+
+
+class VKSimulator:
+    """
+    Реализует методы VK, которые использует проект: wall.post, wall.get, stats.get,
+    groups.getById, photos.getWallUploadServer, photos.saveWallPhoto, execute и upload-сервер.
+    Поддерживает задержку ответа, случайные ошибки (6, 10) и лимит запросов на токен.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 error_codes=(6, 10), rate_limit: float = 0.0, burst: int = 3):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_codes = tuple(error_codes)
+        self.limiter = TokenBucketRegistry(rate_limit, burst) if rate_limit else None
+        self.state = VKSimulatorState()
+        self.methods = {
+            'wall.post': self.wall_post,
+            'wall.get': self.wall_get,
+            'stats.get': self.stats_get,
+            'groups.getById': self.groups_get_by_id,
+            'photos.getWallUploadServer': self.get_wall_upload_server,
+            'photos.saveWallPhoto': self.save_wall_photo,
+        }
+
+    # --- Общая обработка запроса ---
+
+    def _delay(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _check_request(self, params: dict):
+        """Токен, лимит запросов и внедренные ошибки — для каждого HTTP-запроса к API"""
+        token = params.get('access_token')
+        if not token:
+            raise VKError(5)
+        if self.limiter and self.limiter.get_bucket(token).try_acquire() > 0:
+            raise VKError(6)
+        if self.error_rate and random.random() < self.error_rate:
+            raise VKError(random.choice(self.error_codes))
+
+    def handle(self, method: str, params: dict) -> dict:
+        self._delay()
+        try:
+            self._check_request(params)
+            if method == 'execute':
+                return self.execute(params)
+            handler = self.methods.get(method)
+            if handler is None:
+                raise VKError(3, f'Unknown method passed: {method}')
+            return {'response': handler(params)}
+        except VKError as e:
+            return {'error': {'error_code': e.code, 'error_msg': str(e), 'request_params': [
+                {'key': 'method', 'value': method}
+            ]}}
+
+    # --- Методы VK ---
+
+    @staticmethod
+    def _group_id(params: dict, key: str = 'group_id') -> int:
+        try:
+            return abs(int(params[key]))
+        except (KeyError, TypeError, ValueError):
+            raise VKError(100, f'One of the parameters specified was missing or invalid: {key}')
+
+    def wall_post(self, params: dict):
+        group_id = self._group_id(params, 'owner_id')
+        with self.state.lock:
+            wall = self.state.wall(group_id)
+            post_id = len(wall) + 1
+            wall.append({
+                'id': post_id,
+                'owner_id': -group_id,
+                'from_id': -group_id,
+                'date': int(time.time()),
+                'text': params.get('message', ''),
+                'attachments': params.get('attachments', ''),
+                'likes': {'count': 0},
+                'views': {'count': 0},
+                'reposts': {'count': 0},
+                'comments': {'count': 0},
+            })
+        return {'post_id': post_id}
+
+    def wall_get(self, params: dict):
+        group_id = self._group_id(params, 'owner_id')
+        offset = int(params.get('offset', 0))
+        count = min(int(params.get('count', 20)), 100)
+        with self.state.lock:
+            wall = self.state.wall(group_id)
+            # Метрики постов растут со временем, как на настоящей стене
+            for post in wall:
+                post['views']['count'] += random.randint(0, 20)
+                post['likes']['count'] += random.randint(0, 2)
+            items = list(reversed(wall))[offset:offset + count]
+            return {'count': len(wall), 'items': json.loads(json.dumps(items))}
+
+    def stats_get(self, params: dict):
+        self._group_id(params)
+        intervals = int(params.get('intervals_count', 1))
+        now = int(time.time())
+        return [{
+            'period_from': now - (i + 1) * 86400,
+            'period_to': now - i * 86400,
+            'visitors': {'views': random.randint(100, 5000), 'visitors': random.randint(50, 1000)},
+            'reach': {'reach': random.randint(100, 10000), 'reach_subscribers': random.randint(50, 5000)},
+            'activity': {
+                'likes': random.randint(0, 300),
+                'comments': random.randint(0, 50),
+                'copies': random.randint(0, 30),
+            },
+        } for i in range(intervals)]
+
+    def groups_get_by_id(self, params: dict):
+        group_ids = str(params.get('group_id') or params.get('group_ids') or '').split(',')
+        groups = []
+        for raw_id in filter(None, group_ids):
+            group_id = self._group_id({'group_id': raw_id})
+            groups.append({
+                'id': group_id,
+                'name': f'Тестовая группа {group_id}',
+                'screen_name': f'club{group_id}',
+                'members_count': 1000 + group_id % 9000,
+            })
+        return {'groups': groups, 'profiles': []}
+
+    def get_wall_upload_server(self, params: dict):
+        group_id = self._group_id(params)
+        return {
+            'upload_url': f"{request.host_url}upload/{group_id}",
+            'album_id': -14,
+            'user_id': 0,
+        }
+
+    def save_wall_photo(self, params: dict):
+        group_id = self._group_id(params)
+        with self.state.lock:
+            if self.state.photos.pop(params.get('photo'), None) != group_id:
+                raise VKError(100, 'Invalid photo')
+            self.state.saved_photos += 1
+            photo_id = self.state.saved_photos
+        return [{'id': photo_id, 'owner_id': -group_id, 'album_id': -14}]
+
+    def upload(self, group_id: int):
+        photo = request.files.get('photo')
+        if photo is None:
+            return {'server': 1, 'photo': '[]', 'hash': ''}
+        photo.read()
+        token = uuid.uuid4().hex
+        with self.state.lock:
+            self.state.photos[token] = group_id
+        return {'server': 1, 'photo': token, 'hash': uuid.uuid4().hex[:16]}
+
+    def execute(self, params: dict) -> dict:
+        """
+        Понимает только тот VKScript, который строит VKontakteAPI.execute_batch:
+        return [API.method({...}),API.method({...})];
+        Вызовы внутри execute не тратят лимит запросов.
+        """
+        code = params.get('code', '')
+        decoder = json.JSONDecoder()
+        calls = []
+        pos = 0
+        while True:
+            pos = code.find('API.', pos)
+            if pos < 0:
+                break
+            paren = code.index('(', pos)
+            method = code[pos + 4:paren]
+            call_params, pos = decoder.raw_decode(code, paren + 1)
+            calls.append((method, call_params))
+
+        if len(calls) > 25:
+            raise VKError(13, 'Too many API calls')
+
+        results, errors = [], []
+        for method, call_params in calls:
+            try:
+                handler = self.methods.get(method)
+                if handler is None:
+                    raise VKError(3, f'Unknown method passed: {method}')
+                results.append(handler(call_params))
+            except VKError as e:
+                results.append(False)
+                errors.append({'method': method, 'error_code': e.code, 'error_msg': str(e)})
+
+        response = {'response': results}
+        if errors:
+            response['execute_errors'] = errors
+        return response
+
+
+def create_simulator_app(simulator: VKSimulator = None) -> Flask:
+    simulator = simulator or VKSimulator()
+    app = Flask(__name__)
+    app.config['VK_SIMULATOR'] = simulator
+
+    @app.route('/method/<method>', methods=['GET', 'POST'])
+    def vk_method(method):
+        params = request.values.to_dict()
+        return jsonify(simulator.handle(method, params))
+
+    @app.route('/upload/<int:group_id>', methods=['POST'])
+    def vk_upload(group_id):
+        simulator._delay()
+        return jsonify(simulator.upload(group_id))
+
+    @app.route('/image/<name>')
+    def test_image(name):
+        # Картинка для тестов загрузки фото (вместо pollinations)
+        return app.response_class(random.randbytes(64 * 1024), mimetype='image/jpeg')
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный имитатор VK API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', type=float, default=0.05, help='Базовая задержка ответа, сек.')
+    parser.add_argument('--jitter', type=float, default=0.05, help='Случайная добавка к задержке, сек.')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Доля запросов с ошибкой (0..1)')
+    parser.add_argument('--error-codes', default='6,10', help='Коды внедряемых ошибок через запятую')
+    parser.add_argument('--rate-limit', type=float, default=3.0, help='Запросов в секунду на токен (0 — без лимита)')
+    parser.add_argument('--burst', type=int, default=3)
+    args = parser.parse_args()
+
+    simulator = VKSimulator(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_codes=[int(code) for code in args.error_codes.split(',') if code],
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+    )
+    print(f"🧪 Имитатор VK: VK_API_BASE_URL=http://{args.host}:{args.port}/method")
+    create_simulator_app(simulator).run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()